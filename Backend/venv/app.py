@@ -0,0 +1,121 @@
+import openai
+from flask import Flask, jsonify, request
+from flask_socketio import SocketIO
+import atexit
+import os
+
+from core import (
+    API_MAX_RETRIES, BREAKER_COOLDOWN, BREAKER_THRESHOLD, MODERATION_BATCH_SIZE, MODERATION_BATCH_WINDOW,
+    RATE_LIMIT_RPM, RATE_LIMIT_TPM, SCHEDULER_MAX_QUEUE, TRANSCRIPT_DIR, TRANSCRIPT_FLUSH_INTERVAL,
+    TRANSCRIPT_MAX_AGE, open_cache, parse_start_request,
+)
+from engine import BlockingIO, ConversationEngine, run_sync
+from metrics import StageMetrics
+from moderation import ModerationBatcher
+from premoderation import PreModerator
+from scheduler import PRIORITY_MODERATION, CircuitBreaker, RequestScheduler
+from sessions import ConversationSession, SessionRegistry
+from transcript import TranscriptStore
+
+app = Flask(__name__)
+socketio = SocketIO(app, cors_allowed_origins="*")
+
+# Active conversations, one per connected client
+sessions = SessionRegistry()
+
+# Emitted messages, written behind the turn loop for reconnect replay
+transcripts = TranscriptStore(
+    TRANSCRIPT_DIR, flush_interval=TRANSCRIPT_FLUSH_INTERVAL, max_age=TRANSCRIPT_MAX_AGE
+)
+atexit.register(transcripts.close)
+
+# Per-stage timings, served on /metrics
+metrics = StageMetrics()
+
+# Cached completions and moderation verdicts (None when CACHE_MODE is off)
+completion_cache = open_cache("completions")
+moderation_cache = open_cache("moderations")
+
+# Local first-pass moderation; only uncertain messages reach the API
+pre_moderator = PreModerator()
+
+# Rate limits, priorities and retries for every outbound API call
+scheduler = RequestScheduler(
+    rpm=RATE_LIMIT_RPM, tpm=RATE_LIMIT_TPM, max_queue=SCHEDULER_MAX_QUEUE, max_retries=API_MAX_RETRIES
+)
+
+# Moderation checks shared across all conversations
+moderation_batcher = ModerationBatcher(
+    window=MODERATION_BATCH_WINDOW,
+    max_size=MODERATION_BATCH_SIZE,
+    create=lambda inputs: scheduler.call(
+        lambda: openai.Moderation.create(input=inputs), priority=PRIORITY_MODERATION
+    ),
+)
+
+# Turn loop shared with the ASGI server, run on this server's background threads
+engine = ConversationEngine(
+    BlockingIO(socketio, scheduler, moderation_batcher), sessions, transcripts, metrics, pre_moderator,
+    completion_cache=completion_cache, moderation_cache=moderation_cache,
+)
+
+def run_conversation(conversation):
+    """
+    Background task that drives one conversation and unregisters it when done.
+    """
+    run_sync(engine.run_conversation(conversation))
+
+@app.route("/")
+def index():
+    return "Server is running."
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return jsonify(engine.metrics_report())
+
+@socketio.on('start_conversation')
+def start_conversation(data):
+    """
+    Handle the event to start the conversation.
+    The conversation runs as a background task so the handler returns immediately.
+    """
+    agents, topic, prompt_message, toxicity, mediator = parse_start_request(data)
+
+    conversation = ConversationSession(
+        request.sid, agents, topic, prompt_message, toxicity, mediator,
+        breaker=CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN),
+    )
+    sessions.add(conversation)  # Stops any conversation this client already had running
+    socketio.emit('conversation_started', {"conversation_id": conversation.conversation_id}, to=request.sid)
+    conversation.task = socketio.start_background_task(run_conversation, conversation)
+
+@socketio.on('stop_conversation')
+def stop_conversation():
+    """
+    Handle the event to stop the conversation.
+    Only the calling client's conversation is stopped.
+    """
+    sessions.stop(request.sid)
+
+@socketio.on('resume_conversation')
+def resume_conversation(data=None):
+    """
+    Handle a reconnecting client: reattach it to its conversation and replay the messages it missed.
+    """
+    run_sync(engine.resume_conversation(request.sid, data))
+
+@socketio.on('disconnect')
+def disconnect():
+    """
+    Detach the client's conversation when its socket goes away. It keeps
+    running for RESUME_GRACE seconds in case the client reconnects.
+    """
+    sessions.detach(request.sid)
+
+if __name__ == '__main__':
+    socketio.run(
+        app,
+        port=int(os.getenv("PORT", "5000")),
+        debug=os.getenv("FLASK_DEBUG", "1") == "1",
+        allow_unsafe_werkzeug=True,
+    )
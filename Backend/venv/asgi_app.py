@@ -0,0 +1,151 @@
+import aiohttp
+import asyncio
+import json
+import openai
+import socketio
+import uvicorn
+import os
+
+from core import (
+    API_MAX_RETRIES, BREAKER_COOLDOWN, BREAKER_THRESHOLD, MODERATION_BATCH_SIZE, MODERATION_BATCH_WINDOW,
+    RATE_LIMIT_RPM, RATE_LIMIT_TPM, SCHEDULER_MAX_QUEUE, TRANSCRIPT_DIR, TRANSCRIPT_FLUSH_INTERVAL,
+    TRANSCRIPT_MAX_AGE, open_cache, parse_start_request,
+)
+from engine import ConversationEngine, EventLoopIO
+from metrics import StageMetrics
+from moderation import AsyncModerationBatcher
+from premoderation import PreModerator
+from scheduler import PRIORITY_MODERATION, CircuitBreaker, AsyncRequestScheduler
+from sessions import AsyncConversationSession, SessionRegistry
+from transcript import TranscriptStore
+
+# Maximum number of pooled keep-alive connections to the OpenAI API
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins="*")
+
+# Active conversations, one per connected client
+sessions = SessionRegistry()
+
+# Emitted messages, written behind the turn loop for reconnect replay
+transcripts = TranscriptStore(
+    TRANSCRIPT_DIR, flush_interval=TRANSCRIPT_FLUSH_INTERVAL, max_age=TRANSCRIPT_MAX_AGE
+)
+
+# Per-stage timings, served on /metrics
+metrics = StageMetrics()
+
+# Cached completions and moderation verdicts (None when CACHE_MODE is off)
+completion_cache = open_cache("completions")
+moderation_cache = open_cache("moderations")
+
+# Local first-pass moderation; only uncertain messages reach the API
+pre_moderator = PreModerator()
+
+# Rate limits, priorities and retries for every outbound API call
+scheduler = AsyncRequestScheduler(
+    rpm=RATE_LIMIT_RPM, tpm=RATE_LIMIT_TPM, max_queue=SCHEDULER_MAX_QUEUE, max_retries=API_MAX_RETRIES
+)
+
+# Moderation checks shared across all conversations
+moderation_batcher = AsyncModerationBatcher(
+    window=MODERATION_BATCH_WINDOW,
+    max_size=MODERATION_BATCH_SIZE,
+    create=lambda inputs: scheduler.call(
+        lambda: openai.Moderation.acreate(input=inputs), priority=PRIORITY_MODERATION
+    ),
+)
+
+# HTTP session shared by every OpenAI call, created on first use
+http_session = None
+
+def get_http_session():
+    """
+    Returns the shared keep-alive aiohttp session, creating it if needed.
+    """
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=60)
+        http_session = aiohttp.ClientSession(connector=connector)
+    return http_session
+
+async def close_http_session():
+    """
+    Stops all conversations, closes the shared HTTP session and writes out
+    queued transcript messages on shutdown.
+    """
+    for conversation in sessions.all():
+        conversation.stop()
+    await asyncio.to_thread(transcripts.close)
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+
+# Turn loop shared with the Flask server, run as tasks on this event loop
+engine = ConversationEngine(
+    EventLoopIO(sio, scheduler, moderation_batcher), sessions, transcripts, metrics, pre_moderator,
+    completion_cache=completion_cache, moderation_cache=moderation_cache,
+)
+
+async def run_conversation(conversation):
+    """
+    Background task that drives one conversation and unregisters it when done.
+    """
+    # openai reads the session from a context variable, which this task owns
+    openai.aiosession.set(get_http_session())
+    await engine.run_conversation(conversation)
+
+async def http_app(scope, receive, send):
+    """
+    Plain HTTP routes served next to socket.io.
+    """
+    if scope['type'] != 'http':
+        return
+    if scope['path'] == '/metrics':
+        report = await asyncio.to_thread(engine.metrics_report)  # Cache stats count SQLite rows
+        body, content_type = json.dumps(report).encode(), b'application/json'
+    else:
+        body, content_type = b"Server is running.", b'text/plain'
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', content_type)]})
+    await send({'type': 'http.response.body', 'body': body})
+
+@sio.on('start_conversation')
+async def start_conversation(sid, data):
+    """
+    Handle the event to start the conversation.
+    """
+    agents, topic, prompt_message, toxicity, mediator = parse_start_request(data)
+
+    conversation = AsyncConversationSession(
+        sid, agents, topic, prompt_message, toxicity, mediator,
+        breaker=CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN),
+    )
+    sessions.add(conversation)  # Stops any conversation this client already had running
+    await sio.emit('conversation_started', {"conversation_id": conversation.conversation_id}, to=sid)
+    conversation.task = sio.start_background_task(run_conversation, conversation)
+
+@sio.on('stop_conversation')
+async def stop_conversation(sid):
+    """
+    Handle the event to stop the conversation.
+    """
+    sessions.stop(sid)
+
+@sio.on('resume_conversation')
+async def resume_conversation(sid, data=None):
+    """
+    Handle a reconnecting client: reattach it to its conversation and replay the messages it missed.
+    """
+    await engine.resume_conversation(sid, data)
+
+@sio.on('disconnect')
+async def disconnect(sid):
+    """
+    Detach the client's conversation when its socket goes away. It keeps
+    running for RESUME_GRACE seconds in case the client reconnects.
+    """
+    sessions.detach(sid)
+
+app = socketio.ASGIApp(sio, http_app, on_shutdown=close_http_session)
+
+if __name__ == '__main__':
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
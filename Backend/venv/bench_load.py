@@ -0,0 +1,186 @@
+"""
+Load test for the conversation backend against a local mock OpenAI API.
+
+Starts mock_openai in-process, launches the Flask or ASGI server with
+OPENAI_API_BASE pointed at the mock, drives N socket.io clients through
+start_conversation, and reports time-to-first-token, turn latency
+percentiles, turns per second, memory per session and the server's /metrics.
+
+    python bench_load.py [--server asgi] [--clients 100] [--duration 30]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+import socketio
+from aiohttp import web
+
+import mock_openai
+from metrics import summarize
+
+SERVERS = {"flask": "app.py", "asgi": "asgi_app.py"}
+
+
+def rss_bytes(pid):
+    """
+    Resident memory of process `pid`, or None where /proc is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class BenchClient:
+    """
+    One simulated frontend running a single conversation.
+    """
+
+    def __init__(self, url, index):
+        self.url = url
+        self.index = index
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.typing_at = None
+        self.token_seen = False
+        self.first_token = []
+        self.turn_latency = []
+        self.turns = 0
+        self.sio.on("agent_typing", self.on_typing)
+        self.sio.on("conversation_token", self.on_token)
+        self.sio.on("conversation_response", self.on_response)
+
+    async def on_typing(self, data):
+        self.typing_at = time.monotonic()
+        self.token_seen = False
+
+    async def on_token(self, data):
+        if self.typing_at is not None and not self.token_seen:
+            self.token_seen = True
+            self.first_token.append(time.monotonic() - self.typing_at)
+
+    async def on_response(self, data):
+        self.turns += 1
+        if self.typing_at is not None:
+            self.turn_latency.append(time.monotonic() - self.typing_at)
+            self.typing_at = None
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=["websocket"])
+
+    async def start(self):
+        await self.sio.emit("start_conversation", {
+            "topic": f"Benchmark topic {self.index}",
+            "agents": "Alice (economist), Bob (engineer), Carol (teacher)",
+            "prompt": "",
+            "toxicity": 2,
+            "mediator": False,
+        })
+
+    async def stop(self):
+        if self.sio.connected:
+            await self.sio.emit("stop_conversation")
+            await self.sio.disconnect()
+
+
+async def wait_for_server(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+async def fetch_metrics(url):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/metrics") as response:
+            return await response.json()
+
+
+def format_stats(name, samples):
+    stats = summarize(samples)
+    return (
+        f"{name:<16} n={stats['count']:<6} avg={stats['avg'] * 1000:7.1f}ms "
+        f"p50={stats['p50'] * 1000:7.1f}ms p95={stats['p95'] * 1000:7.1f}ms p99={stats['p99'] * 1000:7.1f}ms"
+    )
+
+
+async def run(args):
+    mock = mock_openai.from_arguments(args)
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.mock_port).start()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(
+        os.environ,
+        OPENAI_API_BASE=f"http://127.0.0.1:{args.mock_port}/v1",
+        OPENAI_API_KEY="mock",
+        PORT=str(args.port),
+        FLASK_DEBUG="0",
+        TURN_INTERVAL=str(args.turn_interval),
+    )
+    server = subprocess.Popen([sys.executable, SERVERS[args.server]], cwd=here, env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    clients = []
+    try:
+        await wait_for_server(url)
+        clients = [BenchClient(url, index) for index in range(args.clients)]
+        await asyncio.gather(*(client.connect() for client in clients))
+        rss_idle = rss_bytes(server.pid)
+
+        started = time.monotonic()
+        await asyncio.gather(*(client.start() for client in clients))
+        await asyncio.sleep(args.duration)
+        elapsed = time.monotonic() - started
+        rss_loaded = rss_bytes(server.pid)
+        server_metrics = await fetch_metrics(url)
+    finally:
+        await asyncio.gather(*(client.stop() for client in clients), return_exceptions=True)
+        server.terminate()
+        server.wait()
+        await runner.cleanup()
+
+    turns = sum(client.turns for client in clients)
+    print(f"server={args.server} clients={args.clients} duration={elapsed:.1f}s "
+          f"mock latency={args.latency}s token delay={args.token_delay}s error rate={args.error_rate}")
+    print(format_stats("first token", [s for client in clients for s in client.first_token]))
+    print(format_stats("turn latency", [s for client in clients for s in client.turn_latency]))
+    print(f"{'throughput':<16} {turns} turns, {turns / elapsed:.1f} turns/s, "
+          f"{turns / elapsed / max(1, args.clients) * 60:.1f} turns/min per session")
+    if rss_idle is not None and rss_loaded is not None:
+        print(f"{'memory':<16} {(rss_loaded - rss_idle) / max(1, args.clients) / 1024:.1f} KiB per session "
+              f"({rss_loaded / 2 ** 20:.1f} MiB total)")
+    print(f"{'mock requests':<16} {mock.requests}")
+    print("server /metrics:")
+    print(json.dumps(server_metrics, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", choices=sorted(SERVERS), default="asgi")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run after all clients start")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--mock-port", type=int, default=8001)
+    parser.add_argument("--turn-interval", type=float, default=0.0, help="TURN_INTERVAL for the server")
+    mock_openai.add_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark for the local pre-moderation stage.
+
+Reports local-filter throughput and the fraction of remote moderation calls
+avoided at each toxicity level, on a synthetic corpus of agent replies.
+"blocked" replies are stopped locally, "cleared" ones are passed locally
+(lenient levels only) and "remote" ones go to the moderation API. Part of the
+toxic replies use no lexicon term, so "missed" counts toxic replies that were
+neither blocked locally nor sent for a remote check.
+
+    python bench_premoderation.py [--messages 100000] [--toxic-rate 0.1] [--off-lexicon 0.5]
+"""
+import argparse
+import random
+import time
+
+from premoderation import CLEAN, LEXICON, PreModerator
+
+NEUTRAL = (
+    "I think the proposal has merit but the budget needs more detail",
+    "That is a fair point, although the data suggests otherwise",
+    "We should consider the long term impact on small businesses",
+    "Renewable energy costs have dropped sharply over the last decade",
+    "Could you clarify what you mean by sustainable growth here",
+    "I agree with the previous speaker on the need for regulation",
+    "History shows that these policies tend to work in stages",
+    "Let us focus on the evidence rather than speculation",
+)
+
+# Toxic replies that contain no lexicon term
+OFF_LEXICON = (
+    "People of that religion are vermin and should be exterminated",
+    "Your kind does not belong in this country and never will",
+    "Someone should teach that group a lesson they will never forget",
+    "Women like her are too emotional to be trusted with any decision",
+    "I know where you live and you will regret saying that",
+    "Those people are animals and should be locked away for good",
+)
+
+
+def build_corpus(count, toxic_rate, off_lexicon, seed=0):
+    """
+    Returns `count` (reply, is_toxic) pairs. Roughly `toxic_rate` of them are
+    toxic, and `off_lexicon` of those use no lexicon term.
+    """
+    rng = random.Random(seed)
+    terms = list(LEXICON)
+    corpus = []
+    for _ in range(count):
+        if rng.random() >= toxic_rate:
+            corpus.append((rng.choice(NEUTRAL), False))
+        elif rng.random() < off_lexicon:
+            corpus.append((rng.choice(OFF_LEXICON), True))
+        else:
+            corpus.append((f"{rng.choice(NEUTRAL)}, {' and '.join(rng.sample(terms, rng.randint(1, 3)))}", True))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--toxic-rate", type=float, default=0.1)
+    parser.add_argument("--off-lexicon", type=float, default=0.5, help="share of toxic replies without lexicon terms")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.toxic_rate, args.off_lexicon)
+    print(f"{args.messages} messages, toxic rate {args.toxic_rate}, off-lexicon share {args.off_lexicon}")
+    print(f"{'level':>5} {'msgs/s':>12} {'us/msg':>8} {'blocked':>8} {'cleared':>8} {'remote':>7} {'avoided':>8} {'missed':>7}")
+    for level in range(6):
+        moderator = PreModerator()
+        missed = 0
+        started = time.perf_counter()
+        for text, toxic in corpus:
+            verdict, _ = moderator.classify(text, level)
+            if toxic and verdict == CLEAN:
+                missed += 1
+        elapsed = time.perf_counter() - started
+        stats = moderator.stats()
+        print(
+            f"{level:>5} {len(corpus) / elapsed:>12,.0f} {elapsed / len(corpus) * 1e6:>8.2f} "
+            f"{stats['toxic']:>8} {stats['cleared']:>8} {stats['escalated']:>7} {stats['remote_avoided']:>8.1%} {missed:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    """
+    Returns a stable hash of JSON-serialisable `parts`.
+    """
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    In-memory LRU cache with optional per-entry TTL.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    On-disk key/value table with TTL and approximate least-recently-used
+    eviction. Values are stored as JSON.
+
+    Reads do not write: access times are kept in memory and written in one
+    statement with the next `put`, or once `touch_batch` keys have been read.
+    """
+
+    def __init__(self, path, table, max_entries=100000, ttl=None, touch_batch=256):
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_batch = touch_batch
+        self.evictions = 0
+        self._touched = {}  # key -> access time not yet written
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl and created + self.ttl <= now:
+                self._touched.pop(key, None)
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._write_touched()
+                self._conn.commit()
+        return json.loads(value)
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._write_touched()  # So eviction below sees recent reads
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class TwoTierCache:
+    """
+    LRU memory cache in front of a SQLite store. Disk hits are promoted to memory.
+
+    With `replay` set the cache only serves what an earlier run recorded:
+    callers must treat a miss as a failure instead of calling the API.
+    """
+
+    def __init__(self, memory, disk, replay=False):
+        self.memory = memory
+        self.disk = disk
+        self.replay = replay
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.get_memory(key)
+        if value is None:
+            value = self.get_disk(key)
+        return value
+
+    def get_memory(self, key):
+        """
+        Looks `key` up in the memory tier only. Never touches disk.
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+        return value
+
+    def get_disk(self, key):
+        """
+        Looks `key` up in the disk tier, promoting a hit to memory.
+        """
+        value = self.disk.get(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self.memory.put(key, value)
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        self.disk.put(key, value)
+
+    def stats(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk),
+            "evictions": self.memory.evictions + self.disk.evictions,
+        }
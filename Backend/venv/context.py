@@ -0,0 +1,98 @@
+import re
+from collections import deque
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def count_tokens(text):
+    """
+    Rough token count: about four characters per token.
+    """
+    return max(1, len(text) // 4)
+
+
+def trim_to_tokens(text, limit):
+    """
+    Keeps the end of `text` so it fits in `limit` tokens.
+    """
+    if count_tokens(text) <= limit:
+        return text
+    return "..." + text[-(limit * 4 - 3):]
+
+
+def fold_summary(summary, turns, limit):
+    """
+    Cheap extractive summary update: appends the first sentence of each turn
+    and drops the oldest text once the summary exceeds `limit` tokens.
+    """
+    points = [f"{agent}: {_SENTENCE_END.split(message, 1)[0]}" for agent, message, _ in turns]
+    return trim_to_tokens(" ".join(filter(None, [summary] + points)), limit)
+
+
+class ConversationContext:
+    """
+    Per-conversation prompt context: a running summary of older turns plus a
+    window of recent turns, kept under a fixed token budget.
+
+    Token counts are computed once per turn and cached. When the window
+    overflows, the oldest turns are evicted down to `refill` of the window
+    budget, so summaries are updated every few turns rather than every turn.
+    """
+
+    def __init__(self, budget=1000, summary_budget=200, refill=0.75):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.refill = refill
+        self.summary = ""
+        self.turns = deque()  # (agent, message, tokens)
+        self.window_tokens = 0
+
+    @property
+    def window_budget(self):
+        return self.budget - self.summary_budget
+
+    def add(self, agent, message):
+        """
+        Records a turn. Returns the turns evicted from the window, which the
+        caller should fold into the summary with `fold` or `update_summary`.
+        """
+        tokens = count_tokens(f"{agent}: {message}")
+        if tokens > self.window_budget:
+            message = trim_to_tokens(message, self.window_budget - count_tokens(agent) - 1)
+            tokens = count_tokens(f"{agent}: {message}")
+        self.turns.append((agent, message, tokens))
+        self.window_tokens += tokens
+
+        evicted = []
+        if self.window_tokens > self.window_budget:
+            target = self.window_budget * self.refill
+            while len(self.turns) > 1 and self.window_tokens > target:
+                turn = self.turns.popleft()
+                self.window_tokens -= turn[2]
+                evicted.append(turn)
+        return evicted
+
+    def update_summary(self, summary):
+        """
+        Replaces the running summary, trimmed to the summary budget.
+        """
+        self.summary = trim_to_tokens(summary.strip(), self.summary_budget)
+
+    def fold(self, evicted):
+        """
+        Folds evicted turns into the summary without calling the model.
+        """
+        self.update_summary(fold_summary(self.summary, evicted, self.summary_budget))
+
+    @property
+    def last_message(self):
+        return self.turns[-1][1] if self.turns else None
+
+    def prompt_tokens(self):
+        return (count_tokens(self.summary) if self.summary else 0) + self.window_tokens
+
+    def transcript(self):
+        """
+        Returns the recent turns as 'Agent: message' lines.
+        """
+        return "\n".join(f"{agent}: {message}" for agent, message, _ in self.turns)
@@ -0,0 +1,152 @@
+import openai
+from dotenv import load_dotenv
+import os
+
+from cache import LRUCache, SQLiteStore, TwoTierCache, cache_key
+from context import count_tokens
+from premoderation import remote_flagged
+
+# Load environment variables from .env file
+load_dotenv('key.env')
+
+# Set OpenAI API key
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# Model settings shared by every agent turn
+MODEL = "gpt-3.5-turbo"
+MAX_TOKENS = 25  # Set to a lower value for shorter responses
+
+# Stream agent responses token by token ('conversation_token' events)
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") == "1"
+
+# Minimum seconds per turn; time spent generating counts towards it
+TURN_INTERVAL = float(os.getenv("TURN_INTERVAL", "1"))
+
+# Moderation checks from all conversations are batched into one request
+MODERATION_BATCH_WINDOW = float(os.getenv("MODERATION_BATCH_WINDOW", "0.05"))  # Seconds to collect a batch
+MODERATION_BATCH_SIZE = int(os.getenv("MODERATION_BATCH_SIZE", "32"))  # Send early once this many are waiting
+
+# Prompt context per turn: running summary plus recent turns
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "200"))  # Part of the context budget
+
+# Outbound API limits shared by all conversations
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "3500"))  # Requests per minute, 0 for no limit
+RATE_LIMIT_TPM = int(os.getenv("RATE_LIMIT_TPM", "90000"))  # Tokens per minute, 0 for no limit
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "1000"))  # Calls allowed to wait for admission
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "4"))  # Retries on 429 and server errors
+
+# A conversation pauses after this many failed turns in a row
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "10"))  # Seconds, doubles on each reopening
+
+# Transcripts of emitted messages, kept for reconnect replay
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts"))
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", "0.2"))  # Seconds between disk writes
+TRANSCRIPT_MAX_AGE = float(os.getenv("TRANSCRIPT_MAX_AGE", str(7 * 86400)))  # Seconds; older ones are deleted at startup, 0 keeps all
+
+# Seconds a conversation keeps running after its client disconnects, waiting for 'resume_conversation'
+RESUME_GRACE = float(os.getenv("RESUME_GRACE", "30"))
+
+# Response and moderation cache: "off", "on", or "replay" (only recorded entries are
+# served and never expire, so a recorded run replays exactly; a miss fails the turn)
+CACHE_MODE = os.getenv("CACHE_MODE", "off")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.sqlite3"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))  # Seconds
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", "1024"))
+CACHE_DISK_ENTRIES = int(os.getenv("CACHE_DISK_ENTRIES", "100000"))
+
+# Function to open a response cache
+def open_cache(table):
+    """
+    Returns the two-tier cache stored in `table`, or None if caching is off.
+    """
+    if CACHE_MODE not in ("on", "replay"):
+        return None
+    ttl = None if CACHE_MODE == "replay" else CACHE_TTL
+    return TwoTierCache(
+        LRUCache(max_entries=CACHE_MEMORY_ENTRIES, ttl=ttl),
+        SQLiteStore(CACHE_PATH, table, max_entries=CACHE_DISK_ENTRIES, ttl=ttl),
+        replay=CACHE_MODE == "replay",
+    )
+
+# Functions to build cache keys
+def completion_cache_key(messages):
+    """
+    Keys a completion on the model, prompt messages and sampling parameters.
+    """
+    return cache_key(MODEL, messages, {"max_tokens": MAX_TOKENS})
+
+def moderation_cache_key(text):
+    """
+    Keys a moderation verdict on the hash of the checked text.
+    """
+    return cache_key(text)
+
+# Function to read the 'start_conversation' payload
+def parse_start_request(data):
+    """
+    Extracts the agents, topic, prompt and moderation settings sent by the frontend.
+    """
+    topic = data['topic']
+    agents = data['agents'].split(", ")
+    prompt_message = data.get('prompt', '')  # Extract the prompt from the frontend if available
+    toxicity = data.get('toxicity', 0)  # Slider value, 0 (strict) to 5 (lenient)
+    mediator = bool(data.get('mediator', False))
+    return agents, topic, prompt_message, toxicity, mediator
+
+# Function to build the prompt for an agent's turn
+def build_agent_messages(agent, previous_response, topic, prompt_message=None, context=None):
+    """
+    Builds the chat messages for an agent based on the previous agent's response.
+    With a ConversationContext, the prompt carries the running summary and the
+    recent turns instead of only the previous response.
+    """
+    if context is not None and context.turns:
+        messages = [{"role": "system", "content": f"{agent} responds briefly to the latest message in a discussion about: {topic}."}]
+        if context.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier discussion: {context.summary}"})
+        messages.append({"role": "user", "content": context.transcript()})
+        return messages
+
+    if previous_response:
+        system_prompt = f"{agent} responds briefly to the previous message: {previous_response}."
+    else:
+        system_prompt = f"{agent} responds briefly to the topic: {topic}."
+
+    return [{"role": "system", "content": system_prompt}]
+
+# Function to build the mediator's summary prompt
+def build_summary_messages(summary, turns):
+    """
+    Builds the chat messages asking the mediator to fold `turns` into the running summary.
+    """
+    new_messages = "\n".join(f"{agent}: {message}" for agent, message, _ in turns)
+    return [
+        {"role": "system", "content": (
+            "You are a neutral mediator. Update the running summary of a discussion with the new "
+            f"messages. Reply with the summary only, in under {SUMMARY_TOKEN_BUDGET * 3 // 4} words."
+        )},
+        {"role": "user", "content": f"Summary so far: {summary or '(none)'}\n\nNew messages:\n{new_messages}"},
+    ]
+
+# Function to estimate the tokens a completion will use
+def estimate_tokens(messages, max_tokens=MAX_TOKENS):
+    """
+    Rough token count for rate limiting: about four characters per token
+    for the prompt, plus the completion budget.
+    """
+    return sum(count_tokens(message["content"]) for message in messages) + max_tokens
+
+# Function to read a moderation verdict
+def is_flagged(moderation_result, toxicity=0):
+    """
+    Returns True if the moderation result blocks the checked message at the
+    session's toxicity level. Local verdicts already account for the level.
+    """
+    if not moderation_result:
+        return False
+    result = moderation_result['results'][0]
+    if moderation_result.get('model') == "local":
+        return bool(result['flagged'])
+    return remote_flagged(result, toxicity)
@@ -0,0 +1,403 @@
+import asyncio
+import time
+
+import openai
+
+from core import (
+    CONTEXT_TOKEN_BUDGET, MAX_TOKENS, MODEL, RESUME_GRACE, STREAM_RESPONSES, SUMMARY_TOKEN_BUDGET, TURN_INTERVAL,
+    build_agent_messages, build_summary_messages, completion_cache_key, estimate_tokens, is_flagged,
+    moderation_cache_key,
+)
+from context import ConversationContext
+from premoderation import CLEAN, TOXIC, local_result, toxic_threshold, toxicity_score
+from scheduler import PRIORITY_COMPLETION
+from transcript import check_conversation_id
+
+
+def run_sync(coroutine):
+    """
+    Runs a coroutine that never suspends and returns its result. The Flask
+    server drives the turn loop this way on its background threads, where
+    every BlockingIO call blocks the thread and returns without yielding.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    coroutine.close()
+    raise RuntimeError("run_sync() cannot run a coroutine that suspends")
+
+
+async def _iterate(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class BlockingIO:
+    """
+    I/O for the Flask server: emits, waits and API calls block the calling thread.
+    """
+
+    def __init__(self, socketio, scheduler, moderation_batcher):
+        self.socketio = socketio
+        self.scheduler = scheduler
+        self.moderation_batcher = moderation_batcher
+
+    async def emit(self, event, data, to):
+        self.socketio.emit(event, data, to=to)
+
+    async def wait(self, conversation, seconds):
+        return conversation.wait(seconds)
+
+    async def offload(self, fn, *args):
+        return fn(*args)
+
+    async def complete(self, messages, max_tokens=MAX_TOKENS, stream=False):
+        response = self.scheduler.call(
+            lambda: openai.ChatCompletion.create(
+                model=MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=stream
+            ),
+            priority=PRIORITY_COMPLETION,
+            tokens=estimate_tokens(messages, max_tokens),
+        )
+        return _iterate(response) if stream else response
+
+    async def moderate(self, text):
+        return self.moderation_batcher.check(text)
+
+
+class EventLoopIO:
+    """
+    I/O for the ASGI server: every call yields to the event loop.
+    """
+
+    def __init__(self, sio, scheduler, moderation_batcher):
+        self.sio = sio
+        self.scheduler = scheduler
+        self.moderation_batcher = moderation_batcher
+
+    async def emit(self, event, data, to):
+        await self.sio.emit(event, data, to=to)
+
+    async def wait(self, conversation, seconds):
+        return await conversation.wait(seconds)
+
+    async def offload(self, fn, *args):
+        """
+        Runs blocking `fn` (such as a SQLite cache lookup) on a worker thread.
+        """
+        return await asyncio.to_thread(fn, *args)
+
+    async def complete(self, messages, max_tokens=MAX_TOKENS, stream=False):
+        return await self.scheduler.call(
+            lambda: openai.ChatCompletion.acreate(
+                model=MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=stream
+            ),
+            priority=PRIORITY_COMPLETION,
+            tokens=estimate_tokens(messages, max_tokens),
+        )
+
+    async def moderate(self, text):
+        return await self.moderation_batcher.check(text)
+
+
+class ConversationEngine:
+    """
+    Turn loop shared by both servers: generation, moderation, pacing,
+    failure handling, context summaries and transcripts. Server-specific
+    I/O goes through `io` (BlockingIO or EventLoopIO).
+    """
+
+    def __init__(self, io, sessions, transcripts, metrics, pre_moderator,
+                 completion_cache=None, moderation_cache=None):
+        self.io = io
+        self.sessions = sessions
+        self.transcripts = transcripts
+        self.metrics = metrics
+        self.pre_moderator = pre_moderator
+        self.completion_cache = completion_cache
+        self.moderation_cache = moderation_cache
+
+    async def cache_get(self, cache, key):
+        """
+        Looks `key` up in a two-tier cache; only the disk tier is offloaded.
+        """
+        value = cache.get_memory(key)
+        if value is None:
+            value = await self.io.offload(cache.get_disk, key)
+        return value
+
+    async def cache_put(self, cache, key, value):
+        cache.memory.put(key, value)
+        await self.io.offload(cache.disk.put, key, value)
+
+    async def check_moderation(self, response, toxicity=0):
+        """
+        Checks the response for moderation and toxicity.
+        Clearly toxic responses are blocked locally using the session's toxicity
+        level, and at lenient levels responses without a lexicon hit are passed
+        locally; the rest are batched with other conversations. Returns None if
+        the remote check failed or, in replay mode, was not recorded.
+        """
+        verdict, score = self.pre_moderator.classify(response, toxicity)
+        if verdict == TOXIC:
+            return local_result(True, score)
+        if verdict == CLEAN:
+            return local_result(False, score)
+
+        if self.moderation_cache is not None:
+            cached = await self.cache_get(self.moderation_cache, moderation_cache_key(response))
+            if cached is not None:
+                return cached
+            if self.moderation_cache.replay:
+                print("Moderation verdict not recorded; failing the turn in replay mode")
+                return None
+
+        try:
+            moderation_response = await self.io.moderate(response)
+            if self.moderation_cache is not None:
+                await self.cache_put(self.moderation_cache, moderation_cache_key(response), moderation_response)
+            return moderation_response
+        except Exception as e:
+            print(f"Error in moderation check: {e}")
+            return None
+
+    async def generate_agent_response(self, messages, on_token=None):
+        """
+        Generates an agent's response to `messages` (see build_agent_messages).
+        If `on_token` is given, the completion is streamed and each delta is awaited on it.
+        Returns the response and whether it came from the completion cache;
+        fresh responses are only cached by the caller once they pass moderation.
+        In replay mode a cache miss fails without calling the API.
+        """
+        if self.completion_cache is not None:
+            cached = await self.cache_get(self.completion_cache, completion_cache_key(messages))
+            if cached is not None:
+                if on_token is not None:
+                    await on_token(cached)
+                return cached, True
+            if self.completion_cache.replay:
+                print("Completion not recorded; failing the turn in replay mode")
+                return None, False
+
+        try:
+            if on_token is None:
+                response = await self.io.complete(messages)
+                agent_response = response['choices'][0]['message']['content'].strip()
+            else:
+                chunks = []
+                async for chunk in await self.io.complete(messages, stream=True):
+                    delta = chunk['choices'][0]['delta'].get('content')
+                    if delta:
+                        chunks.append(delta)
+                        await on_token(delta)
+                agent_response = ''.join(chunks).strip()
+            return agent_response, False
+
+        except Exception as e:
+            print(f"Error in OpenAI API call: {e}")
+            return None, False
+
+    async def summarize_turns(self, conversation, context, evicted):
+        """
+        Folds evicted turns into the running summary. With the mediator enabled the
+        model rewrites the summary; otherwise, if that call fails, or in replay
+        mode (summaries are not recorded), the first sentence of each turn is kept.
+        """
+        replaying = self.completion_cache is not None and self.completion_cache.replay
+        if conversation.mediator and not replaying:
+            messages = build_summary_messages(context.summary, evicted)
+            try:
+                response = await self.io.complete(messages, max_tokens=SUMMARY_TOKEN_BUDGET)
+                context.update_summary(response['choices'][0]['message']['content'])
+                return
+            except Exception as e:
+                print(f"Error in summary call: {e}")
+        context.fold(evicted)
+
+    def token_emitter(self, conversation, agent):
+        """
+        Returns a callback that emits each streamed token as a 'conversation_token' event.
+
+        Tokens reach the client before the remote moderation verdict, which
+        needs the whole response. As a first gate the growing text is scored
+        with the local lexicon, and once it reaches the session's toxic
+        threshold no further tokens are forwarded; the finished response is
+        then blocked and withdrawn with 'conversation_discard'. Toxicity the
+        lexicon does not know is only caught by the remote check, after the
+        partial text has been shown.
+        """
+        started = time.monotonic()
+        first_token = [True]
+        text = []
+        threshold = toxic_threshold(conversation.toxicity)
+        held = [False]
+
+        async def on_token(token):
+            if first_token[0]:
+                first_token[0] = False
+                self.metrics.observe("first_token", time.monotonic() - started)
+            text.append(token)
+            if not held[0] and toxicity_score(''.join(text)) >= threshold:
+                held[0] = True
+            if conversation.active and not held[0]:
+                await self.io.emit('conversation_token', {"agent": agent, "token": token}, to=conversation.sid)
+        return on_token
+
+    async def back_off(self, conversation, agent):
+        """
+        Handles a failed turn: withdraws any streamed tokens, records the failure
+        on the conversation's circuit breaker and waits out its pause, telling the
+        client when the breaker opens. Returns False if the conversation was
+        stopped while waiting.
+        """
+        if STREAM_RESPONSES:
+            await self.io.emit('conversation_discard', {"agent": agent}, to=conversation.sid)
+        pause, opened = conversation.breaker.record_failure()
+        if opened:
+            await self.io.emit('conversation_paused', {"reason": "The model API is unavailable", "retry_in": pause}, to=conversation.sid)
+        if not await self.io.wait(conversation, pause):
+            return False
+        if opened:
+            await self.io.emit('conversation_resumed', {}, to=conversation.sid)
+        return True
+
+    async def simulate_conversation(self, conversation):
+        """
+        Simulates a discussion between agents on a given topic and prompt.
+        Each agent responds to the previous agent's response.
+        Events are emitted only to the client that owns the conversation.
+        """
+        io = self.io
+        metrics = self.metrics
+        agents = conversation.agents
+        topic = conversation.topic
+        prompt_message = conversation.prompt_message
+        previous_response = None  # This will store the last agent's response
+        context = ConversationContext(CONTEXT_TOKEN_BUDGET, SUMMARY_TOKEN_BUDGET)
+
+        while conversation.active:
+            for agent in agents:
+                if conversation.abandoned(RESUME_GRACE):
+                    conversation.stop()  # The client disconnected and did not resume
+                if not conversation.active:
+                    break
+
+                turn_started = time.monotonic()
+
+                # Emit 'typing' event while the response is being generated
+                await io.emit('agent_typing', {"agent": agent}, to=conversation.sid)
+
+                on_token = self.token_emitter(conversation, agent) if STREAM_RESPONSES else None
+
+                # Generate OpenAI-based response for the current agent, considering the previous agent's response
+                messages = build_agent_messages(agent, previous_response, topic, prompt_message, context)
+                with metrics.timer("generation"):
+                    response, cached = await self.generate_agent_response(messages, on_token=on_token)
+
+                if not response:
+                    # The API call failed even after retries or returned nothing; back off instead of moving straight on
+                    if not await self.back_off(conversation, agent):
+                        break
+                    continue
+
+                # Check for moderation and toxicity
+                with metrics.timer("moderation"):
+                    moderation_result = await self.check_moderation(response, conversation.toxicity)
+
+                if moderation_result is None:
+                    # An unchecked response is never published; count the turn as failed
+                    if not await self.back_off(conversation, agent):
+                        break
+                    continue
+                conversation.breaker.record_success()
+
+                # If the response is flagged, skip it
+                if is_flagged(moderation_result, conversation.toxicity):
+                    print(f"Moderation flagged response from {agent}: {response}")
+                    if STREAM_RESPONSES:
+                        # Let the frontend drop the partial message it has already shown
+                        await io.emit('conversation_discard', {"agent": agent}, to=conversation.sid)
+                    # Skip this response, but keep the turn's pace so a repeat offender cannot spin
+                    await io.wait(conversation, TURN_INTERVAL - (time.monotonic() - turn_started))
+                    continue
+
+                if self.completion_cache is not None and not cached:
+                    await self.cache_put(self.completion_cache, completion_cache_key(messages), response)
+
+                if conversation.active:
+                    # Emit the full response to the frontend
+                    seq = self.transcripts.append(conversation.conversation_id, agent, response)
+                    with metrics.timer("emit"):
+                        await io.emit('conversation_response', {"agent": agent, "message": response, "seq": seq}, to=conversation.sid)
+                    metrics.observe("turn", time.monotonic() - turn_started)
+
+                    # Update the previous_response to the current agent's response for the next iteration
+                    previous_response = response
+
+                    # Keep the prompt context under budget, summarizing what falls out of it
+                    evicted = context.add(agent, response)
+                    if evicted:
+                        with metrics.timer("summary"):
+                            await self.summarize_turns(conversation, context, evicted)
+
+                    # Pace the discussion, counting generation time towards the turn
+                    await io.wait(conversation, TURN_INTERVAL - (time.monotonic() - turn_started))
+
+    async def run_conversation(self, conversation):
+        """
+        Drives one conversation and unregisters it when done.
+        """
+        try:
+            await self.simulate_conversation(conversation)
+        finally:
+            self.sessions.discard(conversation)
+            self.transcripts.forget(conversation.conversation_id)
+
+    async def resume_conversation(self, sid, data):
+        """
+        Reattaches a reconnecting client to its conversation and replays the
+        messages it missed. The client sends the conversation id from
+        'conversation_started' and the sequence number of the first message
+        it does not have. The replay says whether the conversation is still
+        running; if it is not, 'conversation_ended' follows the replay.
+        """
+        if not isinstance(data, dict):
+            await self.io.emit('error', {"message": "Cannot resume conversation: expected an object"}, to=sid)
+            return
+        conversation_id = data.get('conversation_id')
+        try:
+            # Validate before attaching, so a bad request cannot take over or stop a conversation
+            check_conversation_id(conversation_id)
+            since = int(data.get('since', 0))
+        except (TypeError, ValueError) as e:
+            await self.io.emit('error', {"message": f"Cannot resume conversation: {e}"}, to=sid)
+            return
+        # Attach first, so messages emitted from here on reach the new socket
+        conversation = self.sessions.attach(conversation_id, sid)
+        messages = await self.io.offload(self.transcripts.read_since, conversation_id, since)
+        await self.io.emit('conversation_replay', {
+            "conversation_id": conversation_id, "messages": messages, "active": conversation is not None,
+        }, to=sid)
+        if conversation is None:
+            await self.io.emit('conversation_ended', {"conversation_id": conversation_id}, to=sid)
+
+    def metrics_report(self):
+        """
+        Returns per-stage timings and the state of the shared helpers.
+        """
+        return {
+            "sessions": len(self.sessions),
+            "stages": self.metrics.snapshot(),
+            "scheduler": self.io.scheduler.stats(),
+            "moderation_batches": self.io.moderation_batcher.stats.snapshot(),
+            "premoderation": self.pre_moderator.stats(),
+            "completion_cache": self.completion_cache.stats() if self.completion_cache is not None else None,
+            "moderation_cache": self.moderation_cache.stats() if self.moderation_cache is not None else None,
+        }
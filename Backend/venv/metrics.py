@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of `samples`, which must be sorted.
+    """
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples):
+    """
+    Count, mean, p50/p95/p99 and max of a list of durations in seconds.
+    """
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+class StageMetrics:
+    """
+    Per-stage timings (generation, moderation, emit, ...). Totals cover every
+    observation; percentiles are taken over the most recent `window` samples.
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # stage -> deque of recent durations
+        self._counts = {}
+        self._totals = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+                self._totals[stage] = 0.0
+            self._samples[stage].append(seconds)
+            self._counts[stage] += 1
+            self._totals[stage] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - started)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._samples.items()}
+            counts = dict(self._counts)
+            totals = dict(self._totals)
+        report = {}
+        for stage, samples in stages.items():
+            report[stage] = summarize(samples)
+            report[stage]["count"] = counts[stage]
+            report[stage]["total"] = totals[stage]
+        return report
@@ -0,0 +1,140 @@
+"""
+Local stand-in for the OpenAI API, for load tests that should not spend money.
+
+Serves /v1/chat/completions (including stream=True) and /v1/moderations with
+configurable latency and error rates. Point the backend at it with
+OPENAI_API_BASE=http://127.0.0.1:8001/v1.
+
+    python mock_openai.py [--port 8001] [--latency 0.3] [--token-delay 0.02] [--error-rate 0.01]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+WORDS = (
+    "I think the evidence points both ways, but we should weigh the long term costs "
+    "against the benefits for people affected today and look at what has worked before"
+).split()
+
+
+class MockOpenAI:
+    """
+    aiohttp application emulating the chat completion and moderation endpoints.
+    """
+
+    def __init__(self, latency=0.3, jitter=0.1, token_delay=0.02, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1.0, flag_rate=0.0, seed=None):
+        self.latency = latency  # Seconds before the first byte
+        self.jitter = jitter  # Uniform +/- spread on latency
+        self.token_delay = token_delay  # Seconds between streamed tokens
+        self.error_rate = error_rate  # Share of requests answered with a 500
+        self.rate_limit_rate = rate_limit_rate  # Share answered with a 429
+        self.retry_after = retry_after
+        self.flag_rate = flag_rate  # Share of moderation inputs flagged
+        self.random = random.Random(seed)
+        self.requests = {"chat": 0, "moderation": 0, "errors": 0}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/moderations", self.moderations)
+        return app
+
+    async def _delay(self):
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    def _scripted_error(self):
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.requests["errors"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status=429, headers={"Retry-After": str(self.retry_after)},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.requests["errors"] += 1
+            return web.json_response({"error": {"message": "Mock server error", "type": "server_error"}}, status=500)
+        return None
+
+    def _reply(self, max_tokens):
+        count = self.random.randint(max(1, max_tokens // 2), max(1, max_tokens))
+        return [word + " " for word in self.random.choices(WORDS, k=count)]
+
+    async def chat_completions(self, request):
+        self.requests["chat"] += 1
+        body = await request.json()
+        await self._delay()
+        error = self._scripted_error()
+        if error is not None:
+            return error
+
+        tokens = self._reply(body.get("max_tokens") or 25)
+        created = int(time.time())
+        if not body.get("stream"):
+            return web.json_response({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "length",
+                             "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+                "usage": {"completion_tokens": len(tokens)},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def moderations(self, request):
+        self.requests["moderation"] += 1
+        body = await request.json()
+        await self._delay()
+        error = self._scripted_error()
+        if error is not None:
+            return error
+
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        results = []
+        for _ in inputs:
+            flagged = self.random.random() < self.flag_rate
+            results.append({"flagged": flagged, "categories": {}, "category_scores": {}})
+        return web.json_response({"id": "modr-mock", "model": "text-moderation-mock", "results": results})
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--flag-rate", type=float, default=0.0, help="share of moderation inputs flagged")
+
+
+def from_arguments(args):
+    return MockOpenAI(
+        latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, flag_rate=args.flag_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(from_arguments(args).app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
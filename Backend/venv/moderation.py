@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+
+import openai
+
+
+class _PendingCheck:
+    """
+    One message waiting for its moderation verdict.
+    """
+
+    def __init__(self, text, future=None):
+        self.text = text
+        self.enqueued = time.monotonic()
+        self.future = future  # Set by the async batcher instead of `done`
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchStats:
+    """
+    Counters describing how well moderation checks are being batched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.total_wait = 0.0  # Seconds items spent waiting for their batch to be sent
+
+    def record(self, batch, sent_at):
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.total_wait += sum(sent_at - item.enqueued for item in batch)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "max_batch_size": self.max_batch_size,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "avg_added_wait": self.total_wait / self.items if self.items else 0.0,
+            }
+
+
+def split_results(response, count):
+    """
+    Splits a batched moderation response into one response per input,
+    each shaped like a single-input `openai.Moderation.create` result.
+    """
+    results = response['results']
+    if len(results) != count:
+        raise ValueError(f"Expected {count} moderation results, got {len(results)}")
+    return [
+        {"id": response.get('id'), "model": response.get('model'), "results": [result]}
+        for result in results
+    ]
+
+
+class ModerationBatcher:
+    """
+    Collects moderation checks from all conversation threads and sends them
+    as one multi-input request once `window` seconds have passed since the
+    first pending check or `max_size` checks are waiting.
+
+    The first caller of a batch sends it; the others block until their
+    verdict arrives.
+    """
+
+    def __init__(self, window=0.05, max_size=32, create=None):
+        self.window = window
+        self.max_size = max_size
+        self.stats = BatchStats()
+        self._create = create or (lambda inputs: openai.Moderation.create(input=inputs))
+        self._cond = threading.Condition()
+        self._batch = None
+
+    def check(self, text):
+        """
+        Returns the moderation response for `text`; raises if the request failed.
+        """
+        item = _PendingCheck(text)
+        with self._cond:
+            leader = self._batch is None
+            if leader:
+                self._batch = []
+            batch = self._batch
+            batch.append(item)
+            if len(batch) >= self.max_size:
+                self._batch = None
+                self._cond.notify_all()
+
+        if leader:
+            deadline = item.enqueued + self.window
+            with self._cond:
+                while self._batch is batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._batch = None
+                        break
+                    self._cond.wait(remaining)
+            self._send(batch)
+        else:
+            item.done.wait()
+
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _send(self, batch):
+        self.stats.record(batch, time.monotonic())
+        try:
+            response = self._create([item.text for item in batch])
+            for item, result in zip(batch, split_results(response, len(batch))):
+                item.result = result
+        except Exception as e:
+            for item in batch:
+                item.error = e
+        finally:
+            for item in batch:
+                item.done.set()
+
+
+class AsyncModerationBatcher:
+    """
+    Event-loop version of ModerationBatcher for the ASGI server.
+    """
+
+    def __init__(self, window=0.05, max_size=32, create=None):
+        self.window = window
+        self.max_size = max_size
+        self.stats = BatchStats()
+        self._create = create or (lambda inputs: openai.Moderation.acreate(input=inputs))
+        self._pending = []
+        self._timer = None
+        self._sending = set()  # In-flight batch tasks; the loop only keeps weak references
+
+    async def check(self, text):
+        """
+        Returns the moderation response for `text`; raises if the request failed.
+        """
+        loop = asyncio.get_running_loop()
+        item = _PendingCheck(text, loop.create_future())
+        self._pending.append(item)
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await item.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch):
+        self.stats.record(batch, time.monotonic())
+        try:
+            response = await self._create([item.text for item in batch])
+            results = split_results(response, len(batch))
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        for item, result in zip(batch, results):
+            if not item.future.done():
+                item.future.set_result(result)
@@ -0,0 +1,140 @@
+import re
+import threading
+
+# Local verdicts. A message with no lexicon hit may still be toxic in words
+# the lexicon does not know, so it is only cleared locally (CLEAN) at the
+# lenient levels from LOCAL_CLEAR_LEVEL up, which trade those misses for
+# skipping the remote call. Below that only the remote API can clear it.
+TOXIC = "toxic"
+CLEAN = "clean"
+UNCERTAIN = "uncertain"
+
+LOCAL_CLEAR_LEVEL = 4
+
+# Remote categories blocked at every level, whatever their score
+ALWAYS_BLOCKED = ("sexual/minors", "self-harm/intent", "self-harm/instructions", "hate/threatening")
+
+# Weighted lexicon; a weight is roughly the chance that a message containing
+# the term is toxic on its own
+LEXICON = {
+    # Mild profanity
+    "damn": 0.15, "hell": 0.1, "crap": 0.2, "sucks": 0.15, "screw you": 0.5,
+    # Insults
+    "stupid": 0.35, "idiot": 0.45, "idiots": 0.45, "moron": 0.5, "morons": 0.5,
+    "dumb": 0.3, "loser": 0.4, "pathetic": 0.35, "worthless": 0.45, "trash": 0.3,
+    "shut up": 0.4, "clown": 0.25, "imbecile": 0.5, "disgusting": 0.3,
+    # Hostility and threats
+    "hate you": 0.55, "i hate": 0.3, "go to hell": 0.6, "drop dead": 0.75,
+    "kill you": 0.9, "kill yourself": 0.95, "beat you up": 0.8, "hurt you": 0.7,
+    "destroy you": 0.5, "you deserve to die": 0.95,
+}
+
+# One alternation over every term, longest first so phrases win over their words
+_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(term) for term in sorted(LEXICON, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+
+def toxicity_score(text):
+    """
+    Returns a 0-1 toxicity score for `text`, combining the weights of every
+    distinct lexicon term found (noisy-or).
+    """
+    clean_chance = 1.0
+    for term in {match.lower() for match in _PATTERN.findall(text)}:
+        clean_chance *= 1.0 - LEXICON[term]
+    return 1.0 - clean_chance
+
+
+def toxicity_level(toxicity):
+    """
+    Returns the frontend toxicity level (0 strict - 5 lenient) as an int;
+    invalid values count as 0.
+    """
+    try:
+        return min(max(int(toxicity), 0), 5)
+    except (TypeError, ValueError):
+        return 0
+
+
+def toxic_threshold(toxicity):
+    """
+    Returns the score from which a message is blocked locally, for a frontend
+    toxicity level. Lower scores go to the remote moderation API. At level 5
+    nothing is blocked locally.
+    """
+    return 0.6 + 0.08 * toxicity_level(toxicity)
+
+
+def remote_threshold(toxicity):
+    """
+    Returns the remote category score from which a message is blocked, for a
+    frontend toxicity level: 0.2 at level 0 (stricter than the API's own
+    `flagged`) up to 0.95 at level 5.
+    """
+    return 0.2 + 0.15 * toxicity_level(toxicity)
+
+
+def remote_flagged(result, toxicity=0):
+    """
+    Applies a toxicity level to one entry of a moderation response's
+    `results`. Entries without category scores fall back to `flagged`.
+    """
+    categories = result.get('categories') or {}
+    if any(categories.get(category) for category in ALWAYS_BLOCKED):
+        return True
+    scores = result.get('category_scores')
+    if not scores:
+        return bool(result['flagged'])
+    return max(scores.values()) >= remote_threshold(toxicity)
+
+
+class PreModerator:
+    """
+    Local first-pass moderation in front of the remote moderation API.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.toxic = 0
+        self.cleared = 0
+        self.escalated = 0
+
+    def classify(self, text, toxicity=0):
+        """
+        Returns (verdict, score) where verdict is TOXIC (block without a remote
+        call), CLEAN (pass without a remote call) or UNCERTAIN (ask the remote API).
+        """
+        score = toxicity_score(text)
+        if score >= toxic_threshold(toxicity):
+            verdict = TOXIC
+        elif score == 0.0 and toxicity_level(toxicity) >= LOCAL_CLEAR_LEVEL:
+            verdict = CLEAN
+        else:
+            verdict = UNCERTAIN
+        with self._lock:
+            if verdict == TOXIC:
+                self.toxic += 1
+            elif verdict == CLEAN:
+                self.cleared += 1
+            else:
+                self.escalated += 1
+        return verdict, score
+
+    def stats(self):
+        with self._lock:
+            total = self.toxic + self.cleared + self.escalated
+            return {
+                "toxic": self.toxic,
+                "cleared": self.cleared,
+                "escalated": self.escalated,
+                "remote_avoided": (self.toxic + self.cleared) / total if total else 0.0,
+            }
+
+
+def local_result(flagged, score):
+    """
+    Wraps a local verdict in the shape of an `openai.Moderation.create` response.
+    """
+    return {"model": "local", "results": [{"flagged": flagged, "category_scores": {"local": score}}]}
@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+import openai
+
+# Request priorities; lower runs first
+PRIORITY_MODERATION = 0  # Gates messages that are already generated
+PRIORITY_COMPLETION = 1
+
+# Errors worth retrying after a pause
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+
+
+class SchedulerFull(Exception):
+    """
+    Raised when the scheduler's wait queue is at capacity.
+    """
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to a burst of `capacity`.
+    A `per_minute` of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._level = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` units are available (0 if they are now).
+        """
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self._level) / self.rate)
+
+    def take(self, amount):
+        if self.rate:
+            self._level -= min(amount, self.capacity)
+
+
+def retry_after(error):
+    """
+    Returns the Retry-After delay in seconds sent with an API error, if any.
+    """
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Limits:
+    """
+    Token buckets, backoff policy and admission queue shared by both schedulers.
+    """
+
+    def __init__(self, rpm=3500, tpm=90000, max_queue=1000, max_retries=4,
+                 backoff_base=0.5, backoff_max=30.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self._queue = []  # Heap of (priority, seq) tickets
+        self._seq = itertools.count()
+
+    def backoff(self, attempt, error):
+        """
+        Exponential backoff with full jitter, never shorter than Retry-After.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.backoff_max))
+        return delay
+
+    def _enqueue(self, priority):
+        if len(self._queue) >= self.max_queue:
+            raise SchedulerFull(f"Scheduler queue is full ({self.max_queue} waiting)")
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+
+    def _try_admit(self, ticket, tokens):
+        """
+        Returns 0 and takes capacity if `ticket` may run now, else the seconds to wait
+        (None while other tickets are ahead of it).
+        """
+        if self._queue[0] != ticket:
+            return None
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        heapq.heappop(self._queue)
+        return 0
+
+    def stats(self):
+        return {"queued": len(self._queue), "retries": self.retries}
+
+
+class RequestScheduler(_Limits):
+    """
+    Admits outbound API calls from all conversation threads in priority order
+    under requests-per-minute and tokens-per-minute limits, retrying
+    rate-limit and server errors with backoff.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+
+    def call(self, fn, priority=PRIORITY_COMPLETION, tokens=0):
+        """
+        Runs `fn()` once admitted and returns its result. Raises the last error
+        once retries are exhausted, or SchedulerFull if the queue is full.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._admit(priority, tokens)
+            try:
+                return fn()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self.backoff(attempt, e))
+
+    def _admit(self, priority, tokens):
+        with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_admit(ticket, tokens)
+                    if wait == 0:
+                        return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(ticket)
+                raise
+            finally:
+                self._cond.notify_all()
+
+
+class AsyncRequestScheduler(_Limits):
+    """
+    Event-loop version of RequestScheduler for the ASGI server.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = None
+
+    async def call(self, make_call, priority=PRIORITY_COMPLETION, tokens=0):
+        """
+        Awaits `make_call()` once admitted and returns its result.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._admit(priority, tokens)
+            try:
+                return await make_call()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+
+    async def _admit(self, priority, tokens):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_admit(ticket, tokens)
+                    if wait == 0:
+                        return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._dequeue(ticket)
+                raise
+            finally:
+                self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Per-conversation breaker: after `threshold` consecutive failures it opens
+    and asks the conversation to pause, doubling the pause on each reopening.
+    """
+
+    def __init__(self, threshold=3, cooldown=10.0, max_cooldown=300.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.trips = 0
+
+    def record_success(self):
+        self.failures = 0
+        self.trips = 0
+
+    def record_failure(self):
+        """
+        Returns (pause, opened): how long to wait before the next call, and
+        whether the breaker just opened. While closed the pause is a short
+        backoff; when it opens the pause is the full cooldown.
+        """
+        self.failures += 1
+        if self.failures < self.threshold:
+            return min(self.cooldown, 0.5 * 2 ** (self.failures - 1)), False
+        self.failures = 0
+        self.trips += 1
+        return min(self.max_cooldown, self.cooldown * 2 ** (self.trips - 1)), True
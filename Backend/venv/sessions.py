@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+import uuid
+
+
+class ConversationSession:
+    """
+    State of a single client's conversation, keyed by its socket sid.
+    """
+
+    def __init__(self, sid, agents, topic, prompt_message=None, toxicity=0, mediator=False, breaker=None):
+        self.sid = sid
+        self.conversation_id = uuid.uuid4().hex  # Stable across reconnects, unlike the sid
+        self.agents = agents
+        self.topic = topic
+        self.prompt_message = prompt_message
+        self.toxicity = toxicity
+        self.mediator = mediator
+        self.breaker = breaker  # CircuitBreaker pausing the conversation on repeated API failures
+        self.detached_at = None  # When the client disconnected; None while it is connected
+        self.stop_event = threading.Event()
+        self.task = None
+
+    @property
+    def active(self):
+        return not self.stop_event.is_set()
+
+    def detach(self):
+        self.detached_at = time.monotonic()
+
+    def attach(self, sid):
+        self.sid = sid
+        self.detached_at = None
+
+    def abandoned(self, grace):
+        """
+        Returns True once the client has been disconnected for more than `grace` seconds.
+        """
+        detached_at = self.detached_at
+        return detached_at is not None and time.monotonic() - detached_at > grace
+
+    def stop(self):
+        self.stop_event.set()
+
+    def wait(self, seconds):
+        """
+        Sleeps for up to `seconds`, waking early if the conversation is stopped.
+        Returns True if the conversation is still active afterwards.
+        """
+        if seconds <= 0:
+            return self.active
+        return not self.stop_event.wait(seconds)
+
+
+class AsyncConversationSession(ConversationSession):
+    """
+    Conversation driven by an asyncio task (ASGI server mode).
+    """
+
+    def __init__(self, sid, agents, topic, prompt_message=None, toxicity=0, mediator=False, breaker=None):
+        super().__init__(sid, agents, topic, prompt_message, toxicity, mediator, breaker)
+        self._stopped = asyncio.Event()
+
+    def stop(self):
+        super().stop()
+        self._stopped.set()
+
+    async def wait(self, seconds):
+        """
+        Sleeps for up to `seconds` without blocking the event loop, waking early
+        if the conversation is stopped. Returns True if it is still active.
+        """
+        if seconds <= 0:
+            return self.active
+        try:
+            await asyncio.wait_for(self._stopped.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self.active
+
+
+class SessionRegistry:
+    """
+    Thread-safe registry of active conversations, indexed by the sid of the
+    client watching each one and by conversation id. A conversation whose
+    client disconnects stays registered, detached from any sid, so the client
+    can reattach to it from a new socket.
+    """
+
+    def __init__(self):
+        self._sessions = {}  # sid -> conversation
+        self._conversations = {}  # conversation_id -> conversation, attached or not
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        """
+        Registers a conversation, stopping any earlier one for the same sid.
+        """
+        with self._lock:
+            previous = self._sessions.get(session.sid)
+            self._sessions[session.sid] = session
+            if previous is not None:
+                self._conversations.pop(previous.conversation_id, None)
+            self._conversations[session.conversation_id] = session
+        if previous is not None:
+            previous.stop()
+        return previous
+
+    def get(self, sid):
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def stop(self, sid):
+        """
+        Stops and unregisters the conversation for `sid`, if there is one.
+        """
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+            if session is not None:
+                self._conversations.pop(session.conversation_id, None)
+        if session is not None:
+            session.stop()
+        return session
+
+    def detach(self, sid):
+        """
+        Unbinds the conversation for `sid` from its socket but keeps it running.
+        """
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+            if session is not None:
+                session.detach()
+        return session
+
+    def attach(self, conversation_id, sid):
+        """
+        Binds a running conversation to `sid`, taking it over from any socket
+        it had. Returns the conversation, or None if it has ended.
+        """
+        with self._lock:
+            session = self._conversations.get(conversation_id)
+            if session is None or not session.active:
+                return None
+            replaced = self._sessions.get(sid)
+            if replaced is session:
+                return session
+            if self._sessions.get(session.sid) is session:
+                del self._sessions[session.sid]
+            if replaced is not None:
+                self._conversations.pop(replaced.conversation_id, None)
+            session.attach(sid)
+            self._sessions[sid] = session
+        if replaced is not None:
+            replaced.stop()
+        return session
+
+    def discard(self, session):
+        """
+        Unregisters `session` if it is still registered.
+        """
+        with self._lock:
+            if self._sessions.get(session.sid) is session:
+                del self._sessions[session.sid]
+            if self._conversations.get(session.conversation_id) is session:
+                del self._conversations[session.conversation_id]
+
+    def all(self):
+        with self._lock:
+            return list(self._conversations.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._conversations)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The backend modules sit next to this directory and read their settings on import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TRANSCRIPT_DIR", tempfile.mkdtemp(prefix="transcripts-"))
+os.environ.setdefault("TURN_INTERVAL", "0")
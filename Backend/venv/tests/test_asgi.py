@@ -0,0 +1,87 @@
+import asyncio
+
+import openai
+import pytest
+
+import asgi_app as server
+
+SIDS = ("sid-0", "sid-1")
+
+
+async def fake_acreate(model, messages, max_tokens, stream=False):
+    # Every call must run on the pooled session the conversation task installed
+    assert openai.aiosession.get() is server.http_session
+    await asyncio.sleep(0.005)
+    agent = messages[0]["content"].split(" responds", 1)[0]
+    words = [f"{agent}", " has", " a", " point."]
+    if not stream:
+        return {"choices": [{"message": {"content": "".join(words)}}]}
+
+    async def chunks():
+        for word in words:
+            await asyncio.sleep(0)
+            yield {"choices": [{"delta": {"content": word}}]}
+    return chunks()
+
+
+async def fake_moderation(input):
+    assert openai.aiosession.get() is server.http_session
+    await asyncio.sleep(0.005)
+    return {"results": [{"flagged": False} for _ in input]}
+
+
+@pytest.fixture
+def events(monkeypatch):
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", staticmethod(fake_acreate))
+    monkeypatch.setattr(openai.Moderation, "acreate", staticmethod(fake_moderation))
+    received = {sid: [] for sid in SIDS}
+
+    async def emit(event, data, to):
+        received[to].append((event, data))
+    monkeypatch.setattr(server.sio, "emit", emit)
+    return received
+
+
+def responses(events, sid):
+    return [data for event, data in events[sid] if event == "conversation_response"]
+
+
+async def until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def test_conversations_run_concurrently_on_the_event_loop_and_stop_independently(events):
+    async def run():
+        for index, sid in enumerate(SIDS):
+            await server.start_conversation(sid, {
+                "topic": f"Topic {index}",
+                "agents": f"Ann{index} (economist), Ben{index} (engineer)",
+                "toxicity": 0,
+            })
+        stopped, running = (server.sessions.get(sid) for sid in SIDS)
+
+        await until(lambda: all(len(responses(events, sid)) >= 3 for sid in SIDS))
+        await server.stop_conversation("sid-0")
+        await asyncio.wait_for(stopped.task, 2)
+        published = len(responses(events, "sid-0"))
+
+        await until(lambda: len(responses(events, "sid-1")) >= published + 3)
+        await server.stop_conversation("sid-1")
+        await asyncio.wait_for(running.task, 2)
+        await server.http_session.close()
+        return published
+
+    published = asyncio.run(run())
+
+    assert published >= 3
+    assert len(responses(events, "sid-0")) == published
+    assert len(responses(events, "sid-1")) >= published + 3
+    for index, sid in enumerate(SIDS):
+        agents = {f"Ann{index} (economist)", f"Ben{index} (engineer)"}
+        assert {response["agent"] for response in responses(events, sid)} == agents
+        assert all(response["message"].startswith(response["agent"]) for response in responses(events, sid))
+        tokens = [data["token"] for event, data in events[sid] if event == "conversation_token"]
+        assert "".join(tokens).startswith(f"Ann{index} (economist) has a point.")
+    assert len(server.sessions) == 0
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import engine
+from cache import LRUCache, SQLiteStore, TwoTierCache
+from engine import ConversationEngine, run_sync
+from metrics import StageMetrics
+from premoderation import PreModerator
+from scheduler import CircuitBreaker
+from sessions import ConversationSession, SessionRegistry
+from transcript import TranscriptStore
+
+
+class ScriptedIO:
+    """
+    Engine I/O that answers every completion with `reply` and moderates it as `flagged`.
+    """
+
+    def __init__(self, reply, flagged=False):
+        self.reply = reply
+        self.flagged = flagged
+        self.events = []
+        self.completions = 0
+        self.moderations = 0
+
+    async def emit(self, event, data, to):
+        self.events.append(event)
+
+    async def wait(self, conversation, seconds):
+        return conversation.wait(seconds)
+
+    async def offload(self, fn, *args):
+        return fn(*args)
+
+    async def complete(self, messages, max_tokens=None, stream=False):
+        self.completions += 1
+        if stream:
+            return engine._iterate([{"choices": [{"delta": {"content": self.reply}}]}])
+        return {"choices": [{"message": {"content": self.reply}}]}
+
+    async def moderate(self, text):
+        self.moderations += 1
+        return {"results": [{"flagged": self.flagged}]}
+
+
+def two_tier(directory, replay=False):
+    directory.mkdir(exist_ok=True)
+    return TwoTierCache(LRUCache(max_entries=8), SQLiteStore(str(directory / "cache.sqlite3"), "entries"), replay=replay)
+
+
+def run_for(io, tmp_path, seconds, completion_cache=None, moderation_cache=None):
+    """
+    Runs one two-agent conversation on `io` for `seconds` and returns its engine.
+    """
+    transcripts = TranscriptStore(str(tmp_path / "transcripts"))
+    conversation_engine = ConversationEngine(
+        io, SessionRegistry(), transcripts, StageMetrics(), PreModerator(),
+        completion_cache=completion_cache, moderation_cache=moderation_cache,
+    )
+    conversation = ConversationSession("sid", ["Ann (economist)", "Ben (engineer)"], "Topic", breaker=CircuitBreaker())
+    thread = threading.Thread(target=run_sync, args=(conversation_engine.simulate_conversation(conversation),))
+    thread.start()
+    time.sleep(seconds)
+    conversation.stop()
+    thread.join(timeout=5)
+    transcripts.close()
+    return conversation_engine
+
+
+def test_flagged_completions_are_not_cached_and_keep_the_turn_pace(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "TURN_INTERVAL", 0.1)
+    io = ScriptedIO("Something the moderation API flags.", flagged=True)
+    cache = two_tier(tmp_path)
+
+    run_for(io, tmp_path, 0.5, completion_cache=cache)
+
+    assert len(cache.disk) == 0
+    assert "conversation_response" not in io.events
+    assert 3 <= io.completions <= 7
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_lru_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.put("a", 1)
+
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_sqlite_store_expires_entries(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), "entries", ttl=10)
+    store.put("a", {"value": 1})
+
+    now[0] += 9
+    assert store.get("a") == {"value": 1}
+    now[0] += 2
+    assert store.get("a") is None
+    assert len(store) == 0
+    assert store._touched == {}
+
+
+def test_sqlite_store_eviction_sees_reads_not_yet_written(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), "entries", max_entries=2)
+    store.put("a", 1)
+    now[0] += 1
+    store.put("b", 2)
+    now[0] += 1
+
+    # The read of "a" is only held in memory until the next put
+    assert store.get("a") == 1
+    assert store._touched == {"a": 1002.0}
+    accessed = store._conn.execute("SELECT accessed FROM entries WHERE key = 'a'").fetchone()[0]
+    assert accessed == 1000.0
+
+    now[0] += 1
+    store.put("c", 3)
+
+    assert store._touched == {}
+    assert store.get("b") is None
+    assert (store.get("a"), store.get("c")) == (1, 3)
+    assert store.evictions == 1
+
+
+def test_sqlite_store_writes_reads_in_batches(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), "entries", touch_batch=3)
+    for key in "abc":
+        store.put(key, key)
+
+    store.get("a")
+    store.get("b")
+    assert len(store._touched) == 2
+    store.get("c")
+    assert store._touched == {}
+
+
+def test_two_tier_cache_counts_hits_per_tier_and_promotes_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TwoTierCache(LRUCache(), SQLiteStore(path, "entries")).put("a", "recorded")
+    cache = TwoTierCache(LRUCache(), SQLiteStore(path, "entries"))
+
+    assert cache.get("a") == "recorded"  # From disk, then promoted
+    assert cache.get("a") == "recorded"  # From memory
+    assert cache.get("b") is None
+
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    assert (stats["memory_entries"], stats["disk_entries"]) == (1, 1)
+
+
+def test_replay_serves_recorded_turns_and_fails_misses_without_calling_the_api(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "TURN_INTERVAL", 0.05)
+
+    # Record a run, then replay it from the same files with a fresh engine
+    recorded = ScriptedIO("Ann has a point.")
+    run_for(recorded, tmp_path, 0.3,
+            completion_cache=two_tier(tmp_path / "completions"), moderation_cache=two_tier(tmp_path / "moderations"))
+    assert recorded.completions >= 2
+
+    replayed = ScriptedIO("A reply that was never recorded.")
+    run_for(replayed, tmp_path, 0.3,
+            completion_cache=two_tier(tmp_path / "completions", replay=True),
+            moderation_cache=two_tier(tmp_path / "moderations", replay=True))
+
+    assert (replayed.completions, replayed.moderations) == (0, 0)
+    assert "conversation_response" in replayed.events
+
+    # An empty recording fails every turn instead of going to the API
+    missed = ScriptedIO("Ann has a point.")
+    run_for(missed, tmp_path, 0.3, completion_cache=two_tier(tmp_path / "empty", replay=True))
+
+    assert missed.completions == 0
+    assert "conversation_response" not in missed.events
+    assert "conversation_discard" in missed.events
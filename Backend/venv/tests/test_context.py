@@ -0,0 +1,49 @@
+import random
+
+from context import ConversationContext, count_tokens
+from core import build_agent_messages, estimate_tokens
+
+TURNS = 5000
+
+
+def reply(rng, turn):
+    sentences = rng.randint(1, 6)
+    return " ".join(f"Point {turn}.{index} about the budget and its long term effects." for index in range(sentences))
+
+
+def test_prompt_stays_under_budget_with_folded_summaries():
+    rng = random.Random(0)
+    context = ConversationContext(budget=1000, summary_budget=200)
+    prompt_sizes = []
+
+    for turn in range(TURNS):
+        evicted = context.add(f"Agent{turn % 3}", reply(rng, turn))
+        if evicted:
+            context.fold(evicted)
+        assert context.prompt_tokens() <= context.budget
+        messages = build_agent_messages("Agent0", None, "the budget", context=context)
+        prompt_sizes.append(estimate_tokens(messages, 0))
+
+    # Flat: the last thousand turns need no more prompt than the first thousand
+    assert max(prompt_sizes[-1000:]) <= max(prompt_sizes[:1000])
+    assert max(prompt_sizes) <= context.budget + 50  # Budget plus the fixed instructions
+
+
+def test_prompt_stays_under_budget_with_model_summaries():
+    context = ConversationContext(budget=500, summary_budget=100)
+
+    for turn in range(TURNS):
+        evicted = context.add("Agent", f"Reply {turn}. " * 20)
+        if evicted:
+            # A mediator that ignores the requested length
+            context.update_summary("Summary of the discussion so far. " * 50)
+        assert context.prompt_tokens() <= context.budget
+        assert count_tokens(context.summary or " ") <= context.summary_budget
+
+
+def test_oversized_turn_is_trimmed_to_the_window():
+    context = ConversationContext(budget=300, summary_budget=100)
+    context.add("Agent", "word " * 2000)
+
+    assert context.prompt_tokens() <= context.budget
+    assert len(context.turns) == 1
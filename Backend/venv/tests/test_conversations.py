@@ -0,0 +1,241 @@
+import threading
+import time
+
+import openai
+import pytest
+
+import app as server
+import engine
+
+CLIENTS = 5
+
+
+def fake_completion(model, messages, max_tokens, stream=False):
+    """
+    Replies "<agent> has a point.", except for agents named Toxic* (a lexicon
+    threat), Empty* (nothing) and Flagged* (flagged by fake_moderation).
+    """
+    agent = messages[0]["content"].split(" responds", 1)[0]
+    if agent.startswith("Toxic"):
+        words = ["You", " should", " kill", " yourself", " now."]
+    elif agent.startswith("Empty"):
+        words = []
+    else:
+        words = [f"{agent}", " has", " a", " point."]
+    if stream:
+        return iter([{"choices": [{"delta": {"content": word}}]} for word in words])
+    return {"choices": [{"message": {"content": "".join(words)}}]}
+
+
+def fake_moderation(input):
+    return {"results": [{"flagged": text.startswith("Flagged")} for text in input]}
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setattr(openai.ChatCompletion, "create", staticmethod(fake_completion))
+    monkeypatch.setattr(openai.Moderation, "create", staticmethod(fake_moderation))
+    threads = set(threading.enumerate())
+    clients = [server.socketio.test_client(server.app) for _ in range(CLIENTS)]
+    yield clients
+    for client in clients:
+        if client.is_connected():
+            client.emit("stop_conversation")
+            client.disconnect()
+    # Let the conversation threads finish their last turn while the API is still stubbed
+    for thread in set(threading.enumerate()) - threads:
+        thread.join(timeout=5)
+
+
+def start(client, index, agents=None):
+    client.emit("start_conversation", {
+        "topic": f"Topic {index}",
+        "agents": agents or f"Ann{index} (economist), Ben{index} (engineer)",
+        "toxicity": 0,
+    })
+
+
+def responses(client):
+    return [packet["args"][0] for packet in client.get_received() if packet["name"] == "conversation_response"]
+
+
+def collect(clients, minimum, timeout=10.0):
+    """
+    Receives until every client has at least `minimum` responses.
+    """
+    received = [[] for _ in clients]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and min(map(len, received)) < minimum:
+        for index, client in enumerate(clients):
+            received[index].extend(responses(client))
+        time.sleep(0.02)
+    return received
+
+
+def events(client, minimum, timeout=10.0):
+    """
+    Receives (name, data, arrival time) until `minimum` responses have arrived.
+    """
+    received = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and [name for name, _, _ in received].count("conversation_response") < minimum:
+        now = time.monotonic()
+        received.extend((packet["name"], packet["args"][0], now) for packet in client.get_received())
+        time.sleep(0.01)
+    return received
+
+
+def turns(received):
+    """
+    Splits events into turns, each starting with 'agent_typing'.
+    """
+    split = []
+    for name, data, _ in received:
+        if name == "agent_typing":
+            split.append((data["agent"], []))
+        elif split:
+            split[-1][1].append((name, data))
+    return split
+
+
+def test_sessions_progress_in_parallel_with_their_own_events(clients):
+    for index, client in enumerate(clients):
+        start(client, index)
+
+    received = collect(clients, minimum=4)
+
+    for index, messages in enumerate(received):
+        assert len(messages) >= 4
+        agents = {f"Ann{index} (economist)", f"Ben{index} (engineer)"}
+        assert {message["agent"] for message in messages} <= agents
+        assert all(message["message"].startswith(message["agent"]) for message in messages)
+    assert len(server.sessions) == CLIENTS
+
+
+def test_stopping_one_session_leaves_the_others_running(clients):
+    for index, client in enumerate(clients):
+        start(client, index)
+    collect(clients, minimum=2)
+
+    stopped, running = clients[0], clients[1:]
+    stopped.emit("stop_conversation")
+    time.sleep(0.2)  # Let a turn already past its active check finish
+    for client in clients:
+        client.get_received()
+
+    received = collect(running, minimum=3)
+    assert all(len(messages) >= 3 for messages in received)
+    assert responses(stopped) == []
+    assert len(server.sessions) == CLIENTS - 1
+
+
+def test_reconnected_client_resumes_its_conversation(clients):
+    first, second = clients[0], clients[1]
+    start(first, 0)
+    received = first.get_received()
+    conversation_id = next(packet["args"][0]["conversation_id"] for packet in received if packet["name"] == "conversation_started")
+    seen = collect([first], minimum=2)[0]
+    first.disconnect()
+
+    second.emit("resume_conversation", {"conversation_id": conversation_id, "since": seen[-1]["seq"] + 1})
+    replay = next(packet["args"][0] for packet in second.get_received() if packet["name"] == "conversation_replay")
+    assert replay["active"] is True
+    live = collect([second], minimum=2)[0]
+
+    assert len(live) >= 2
+    assert all(message["agent"] in ("Ann0 (economist)", "Ben0 (engineer)") for message in live)
+    assert len(server.sessions) == 1
+
+
+def test_invalid_resume_requests_leave_running_conversations_alone(clients):
+    owner, other = clients[0], clients[1]
+    start(owner, 0)
+    start(other, 1)
+    conversation_id = next(packet["args"][0]["conversation_id"] for packet in owner.get_received() if packet["name"] == "conversation_started")
+
+    # A bad `since` must be rejected before the owner's conversation is taken over,
+    # and a bad id before the other client's own conversation is replaced
+    other.emit("resume_conversation", {"conversation_id": conversation_id, "since": "latest"})
+    other.emit("resume_conversation", {"conversation_id": "not-an-id"})
+
+    assert [packet["name"] for packet in other.get_received() if packet["name"] == "error"] == ["error", "error"]
+    assert len(collect([owner, other], minimum=2)[0]) >= 2
+    assert len(server.sessions) == 2
+
+
+def test_resuming_an_ended_conversation_says_so(clients):
+    clients[0].emit("resume_conversation", {"conversation_id": "0" * 32})
+    clients[0].emit("resume_conversation")
+
+    received = clients[0].get_received()
+    assert [packet["name"] for packet in received] == ["conversation_replay", "conversation_ended", "error"]
+    assert received[0]["args"][0]["active"] is False
+
+
+def test_moderation_failure_fails_the_turn(clients, monkeypatch):
+    def unavailable(input):
+        raise openai.error.RateLimitError("Rate limit reached", http_status=429)
+
+    monkeypatch.setattr(openai.Moderation, "create", staticmethod(unavailable))
+    monkeypatch.setattr(server.scheduler, "max_retries", 0)
+    client = clients[0]
+    start(client, 0)
+
+    names = []
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and "conversation_paused" not in names:
+        names.extend(packet["name"] for packet in client.get_received())
+        time.sleep(0.02)
+
+    # Three failed checks in a row open the breaker; nothing unmoderated is published
+    assert names.count("conversation_discard") == 3
+    assert "conversation_paused" in names
+    assert "conversation_response" not in names
+
+
+def test_tokens_stream_before_each_response(clients):
+    start(clients[0], 0)
+
+    completed = [turn for turn in turns(events(clients[0], minimum=3)) if turn[1] and turn[1][-1][0] == "conversation_response"]
+
+    assert len(completed) >= 3
+    for agent, turn in completed:
+        *tokens, (_, response) = turn
+        assert {name for name, _ in tokens} == {"conversation_token"}
+        assert {data["agent"] for _, data in tokens} == {agent}
+        assert "".join(data["token"] for _, data in tokens) == response["message"]
+
+
+@pytest.mark.parametrize("agent", ["Flagged0 (critic)", "Empty0 (mute)"])
+def test_flagged_and_empty_replies_are_discarded(clients, agent):
+    start(clients[0], 0, agents=f"{agent}, Ann0 (economist)")
+
+    received = turns(events(clients[0], minimum=2))
+    rejected = [turn for name, turn in received if name == agent and turn and turn[-1][0] != "conversation_token"]
+
+    assert rejected
+    assert all(turn[-1] == ("conversation_discard", {"agent": agent}) for turn in rejected)
+    assert all(name != "conversation_response" for turn in rejected for name, _ in turn)
+
+
+def test_tokens_stop_at_a_toxic_term(clients):
+    start(clients[0], 0, agents="Toxic0 (troll), Ann0 (economist)")
+
+    received = turns(events(clients[0], minimum=2))
+    toxic = [turn for name, turn in received if name == "Toxic0 (troll)" and turn and turn[-1][0] != "conversation_token"]
+
+    assert toxic
+    for turn in toxic:
+        # The token completing "kill yourself" and everything after it is held back
+        assert "".join(data["token"] for name, data in turn if name == "conversation_token") == "You should kill"
+        assert turn[-1] == ("conversation_discard", {"agent": "Toxic0 (troll)"})
+
+
+def test_turns_are_paced_by_the_turn_interval(clients, monkeypatch):
+    monkeypatch.setattr(engine, "TURN_INTERVAL", 0.2)
+    start(clients[0], 0)
+
+    arrivals = [arrived for name, _, arrived in events(clients[0], minimum=4) if name == "conversation_response"]
+
+    assert len(arrivals) >= 4
+    assert all(later - earlier >= 0.15 for earlier, later in zip(arrivals, arrivals[1:]))
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+from moderation import AsyncModerationBatcher, ModerationBatcher
+
+CHECKS = 40
+
+
+class CountingEndpoint:
+    """
+    Stubbed moderation endpoint that counts requests and flags inputs starting with "bad".
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def respond(self, inputs):
+        with self.lock:
+            self.calls += 1
+        return {
+            "id": f"modr-{self.calls}",
+            "model": "stub",
+            "results": [{"flagged": text.startswith("bad"), "input": text} for text in inputs],
+        }
+
+    def create(self, inputs):
+        return self.respond(inputs)
+
+    async def acreate(self, inputs):
+        await asyncio.sleep(0.01)
+        return self.respond(inputs)
+
+
+def message(index):
+    return f"bad message {index}" if index % 3 == 0 else f"message {index}"
+
+
+def assert_own_results(results):
+    for index, response in enumerate(results):
+        assert len(response["results"]) == 1
+        assert response["results"][0]["input"] == message(index)
+        assert response["results"][0]["flagged"] == (index % 3 == 0)
+
+
+def test_concurrent_checks_share_requests():
+    endpoint = CountingEndpoint()
+    batcher = ModerationBatcher(window=0.05, max_size=16, create=endpoint.create)
+    results = [None] * CHECKS
+    barrier = threading.Barrier(CHECKS)
+
+    def check(index):
+        barrier.wait()
+        results[index] = batcher.check(message(index))
+
+    threads = [threading.Thread(target=check, args=(index,)) for index in range(CHECKS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert endpoint.calls < CHECKS
+    assert batcher.stats.snapshot()["items"] == CHECKS
+    assert_own_results(results)
+
+
+def test_failed_batch_raises_for_every_caller():
+    def create(inputs):
+        raise RuntimeError("moderation unavailable")
+
+    batcher = ModerationBatcher(window=0.05, create=create)
+    errors = []
+
+    def check():
+        try:
+            batcher.check("hello")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=check) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(errors) == 5
+
+
+def test_async_concurrent_checks_share_requests():
+    endpoint = CountingEndpoint()
+
+    async def run():
+        batcher = AsyncModerationBatcher(window=0.05, max_size=16, create=endpoint.acreate)
+        results = await asyncio.gather(*(batcher.check(message(index)) for index in range(CHECKS)))
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+
+    assert endpoint.calls == 3  # 16 + 16 at max_size, the last 8 when the window closes
+    assert not batcher._sending
+    assert_own_results(results)
+
+
+def test_async_failed_batch_raises_for_every_caller():
+    async def create(inputs):
+        raise RuntimeError("moderation unavailable")
+
+    async def run():
+        batcher = AsyncModerationBatcher(window=0.01, create=create)
+        return await asyncio.gather(*(batcher.check("hello") for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,68 @@
+import pytest
+
+from core import is_flagged
+from premoderation import (
+    CLEAN, LOCAL_CLEAR_LEVEL, TOXIC, UNCERTAIN, PreModerator, local_result, toxic_threshold, toxicity_score,
+)
+
+OFF_LEXICON = "People of that religion are vermin and should be exterminated."
+
+
+@pytest.mark.parametrize("level", range(LOCAL_CLEAR_LEVEL))
+def test_lexicon_misses_go_to_the_remote_api(level):
+    moderator = PreModerator()
+    verdict, score = moderator.classify(OFF_LEXICON, level)
+
+    assert score == 0.0
+    assert verdict == UNCERTAIN
+
+
+@pytest.mark.parametrize("level", range(LOCAL_CLEAR_LEVEL, 6))
+def test_lenient_levels_clear_lexicon_misses_locally(level):
+    moderator = PreModerator()
+
+    # The trade-off: toxicity the lexicon does not know passes unchecked
+    assert moderator.classify(OFF_LEXICON, level) == (CLEAN, 0.0)
+    # Mild lexicon hits are still checked remotely
+    assert moderator.classify("What a clown", level)[0] == UNCERTAIN
+    assert moderator.stats()["remote_avoided"] == 0.5
+
+
+def test_strong_lexicon_hits_are_blocked_locally_except_at_level_5():
+    moderator = PreModerator()
+    text = "Go and kill yourself"
+
+    assert [moderator.classify(text, level)[0] for level in range(6)] == [TOXIC] * 5 + [UNCERTAIN]
+    assert moderator.stats()["remote_avoided"] == 5 / 6
+
+
+def test_scores_combine_distinct_terms():
+    assert toxicity_score("you idiot") == pytest.approx(0.45)
+    assert toxicity_score("stupid idiot, IDIOT") == pytest.approx(1 - 0.65 * 0.55)
+    assert toxic_threshold("not a level") == toxic_threshold(0)
+
+
+def remote(flagged, categories=None, **scores):
+    return {"model": "text-moderation-007", "results": [{
+        "flagged": flagged, "categories": categories or {}, "category_scores": scores,
+    }]}
+
+
+def test_remote_scores_are_judged_at_the_session_level():
+    harassment = remote(True, harassment=0.6)
+
+    assert [is_flagged(harassment, level) for level in range(6)] == [True] * 3 + [False] * 3
+    assert [is_flagged(remote(False, hate=0.3), level) for level in range(6)] == [True] + [False] * 5
+
+
+def test_severe_categories_are_blocked_at_every_level():
+    result = remote(True, {"self-harm/intent": True}, **{"self-harm/intent": 0.4})
+
+    assert all(is_flagged(result, level) for level in range(6))
+
+
+def test_results_without_scores_use_the_remote_flag():
+    assert is_flagged({"results": [{"flagged": True}]}, 5)
+    assert not is_flagged({"results": [{"flagged": False}]}, 0)
+    assert not is_flagged(local_result(False, 0.0), 0)
+    assert not is_flagged(None)
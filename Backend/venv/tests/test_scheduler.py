@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+
+import openai
+import pytest
+
+from scheduler import (
+    PRIORITY_COMPLETION, PRIORITY_MODERATION, AsyncRequestScheduler, CircuitBreaker, RequestScheduler,
+    SchedulerFull, TokenBucket,
+)
+
+
+class ScriptedEndpoint:
+    """
+    Local stub that raises the scripted errors in order, then succeeds.
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def __call__(self):
+        self.calls.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+    async def acall(self):
+        return self()
+
+
+def rate_limited(retry_after):
+    return openai.error.RateLimitError("Rate limit reached", http_status=429, headers={"Retry-After": str(retry_after)})
+
+
+def server_error():
+    return openai.error.APIError("Internal server error", http_status=500)
+
+
+def test_backoff_is_never_shorter_than_retry_after():
+    scheduler = RequestScheduler(backoff_base=0.01)
+    error = rate_limited(2)
+    assert all(scheduler.backoff(attempt, error) >= 2 for attempt in range(5))
+    assert scheduler.backoff(0, server_error()) <= 0.01
+
+
+def test_retries_rate_limit_after_retry_after():
+    endpoint = ScriptedEndpoint(rate_limited(0.3))
+    scheduler = RequestScheduler(backoff_base=0.01)
+
+    assert scheduler.call(endpoint) == "ok"
+    assert len(endpoint.calls) == 2
+    assert endpoint.calls[1] - endpoint.calls[0] >= 0.3
+    assert scheduler.stats()["retries"] == 1
+
+
+def test_retries_server_errors_then_gives_up():
+    endpoint = ScriptedEndpoint(server_error(), server_error())
+    assert RequestScheduler(backoff_base=0.01).call(endpoint) == "ok"
+
+    endpoint = ScriptedEndpoint(*[server_error() for _ in range(3)])
+    with pytest.raises(openai.error.APIError):
+        RequestScheduler(max_retries=2, backoff_base=0.01).call(endpoint)
+    assert len(endpoint.calls) == 3
+
+
+def test_async_retries_rate_limit_after_retry_after():
+    endpoint = ScriptedEndpoint(rate_limited(0.3))
+    scheduler = AsyncRequestScheduler(backoff_base=0.01)
+
+    assert asyncio.run(scheduler.call(endpoint.acall)) == "ok"
+    assert endpoint.calls[1] - endpoint.calls[0] >= 0.3
+
+
+def test_token_bucket_admits_a_burst_then_refills():
+    bucket = TokenBucket(per_minute=600, capacity=2)  # 10 per second
+    for _ in range(2):
+        assert bucket.wait_time(1) == 0
+        bucket.take(1)
+    assert 0.05 < bucket.wait_time(1) <= 0.1
+    assert TokenBucket(per_minute=0).wait_time(1000) == 0
+
+
+def test_requests_are_admitted_at_the_bucket_rate():
+    scheduler = RequestScheduler(rpm=600, tpm=0)
+    scheduler.requests = TokenBucket(600, capacity=1)  # One call per 0.1s, no burst
+    started = time.monotonic()
+    for _ in range(4):
+        scheduler.call(lambda: None)
+    assert time.monotonic() - started >= 0.28
+
+
+def test_token_budget_delays_large_requests():
+    scheduler = AsyncRequestScheduler(rpm=0, tpm=600)
+    scheduler.tokens = TokenBucket(600, capacity=10)  # 10 tokens per second
+
+    async def run():
+        started = time.monotonic()
+        await scheduler.call(lambda: asyncio.sleep(0), tokens=10)
+        await scheduler.call(lambda: asyncio.sleep(0), tokens=5)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.45
+
+
+def test_moderation_is_admitted_before_queued_completions():
+    scheduler = RequestScheduler(rpm=1200, tpm=0)
+    scheduler.requests = TokenBucket(1200, capacity=1)  # One call per 0.05s
+    scheduler.requests.take(1)
+    order = []
+    lock = threading.Lock()
+
+    def submit(name, priority):
+        def call():
+            with lock:
+                order.append(name)
+        scheduler.call(call, priority=priority)
+
+    threads = [threading.Thread(target=submit, args=(f"completion {index}", PRIORITY_COMPLETION)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.02)  # All three completions are queued
+    threads.append(threading.Thread(target=submit, args=("moderation", PRIORITY_MODERATION)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order[0] == "moderation"
+    assert sorted(order[1:]) == ["completion 0", "completion 1", "completion 2"]
+
+
+def test_async_moderation_is_admitted_before_queued_completions():
+    scheduler = AsyncRequestScheduler(rpm=1200, tpm=0)
+    scheduler.requests = TokenBucket(1200, capacity=1)
+    scheduler.requests.take(1)
+    order = []
+
+    async def submit(name, priority):
+        async def call():
+            order.append(name)
+        await scheduler.call(call, priority=priority)
+
+    async def run():
+        completions = [asyncio.ensure_future(submit(f"completion {index}", PRIORITY_COMPLETION)) for index in range(3)]
+        await asyncio.sleep(0.02)
+        await asyncio.gather(submit("moderation", PRIORITY_MODERATION), *completions)
+
+    asyncio.run(run())
+
+    assert order == ["moderation", "completion 0", "completion 1", "completion 2"]
+
+
+def test_full_queue_is_rejected():
+    with pytest.raises(SchedulerFull):
+        RequestScheduler(max_queue=0).call(lambda: None)
+
+
+def test_breaker_opens_after_threshold_with_doubling_cooldown():
+    breaker = CircuitBreaker(threshold=3, cooldown=10, max_cooldown=35)
+
+    assert breaker.record_failure() == (0.5, False)
+    assert breaker.record_failure() == (1.0, False)
+    assert breaker.record_failure() == (10, True)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.record_failure() == (20, True)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.record_failure() == (35, True)  # Capped at max_cooldown
+
+    breaker.record_success()
+    for _ in range(2):
+        assert breaker.record_failure()[1] is False
+    assert breaker.record_failure() == (10, True)
@@ -0,0 +1,205 @@
+import json
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+
+# Each index entry is the byte offset of one message in the transcript file
+_OFFSET = struct.Struct("<Q")
+
+_CONVERSATION_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def check_conversation_id(conversation_id):
+    """
+    Raises ValueError unless `conversation_id` has the form of a conversation id (32 hex digits).
+    """
+    if not isinstance(conversation_id, str) or not _CONVERSATION_ID.fullmatch(conversation_id):
+        raise ValueError(f"Invalid conversation id: {conversation_id!r}")
+
+
+class TranscriptStore:
+    """
+    Append-only JSONL transcript per conversation, written behind the turn loop.
+
+    `append` only queues the message; a background thread writes queued
+    messages in batches every `flush_interval` seconds. Next to each
+    `<id>.jsonl` file, `<id>.idx` holds the byte offset of every message, so
+    `read_since(n)` can seek straight to message n and memory-map the tail.
+    Messages that are queued but not yet written are served from memory.
+    """
+
+    def __init__(self, directory, flush_interval=0.2, max_batch=512, max_age=None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_seq = {}  # conversation_id -> next sequence number
+        self._pending = {}  # conversation_id -> queued, unwritten records
+        self._finished = set()  # Forgotten conversations whose records are still queued
+        os.makedirs(directory, exist_ok=True)
+        if max_age:
+            self.prune(max_age)
+        self._writer = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._writer.start()
+
+    def _paths(self, conversation_id):
+        check_conversation_id(conversation_id)
+        base = os.path.join(self.directory, conversation_id)
+        return base + ".jsonl", base + ".idx"
+
+    def _stored_count(self, conversation_id):
+        _, index_path = self._paths(conversation_id)
+        try:
+            return os.path.getsize(index_path) // _OFFSET.size
+        except OSError:
+            return 0
+
+    def append(self, conversation_id, agent, message):
+        """
+        Queues a message for writing and returns its sequence number. Never touches disk.
+        """
+        with self._lock:
+            seq = self._next_seq.get(conversation_id)
+            if seq is None:
+                seq = self._stored_count(conversation_id)
+            self._next_seq[conversation_id] = seq + 1
+            record = {"seq": seq, "agent": agent, "message": message, "time": time.time()}
+            self._pending.setdefault(conversation_id, []).append(record)
+        self._queue.put((conversation_id, record))
+        return seq
+
+    def read_since(self, conversation_id, since=0):
+        """
+        Returns the messages with sequence number >= `since`, oldest first.
+        """
+        since = max(0, int(since))
+        with self._lock:
+            pending = [record for record in self._pending.get(conversation_id, []) if record["seq"] >= since]
+        records = self._read_stored(conversation_id, since)
+        last_seq = records[-1]["seq"] if records else since - 1
+        return records + [record for record in pending if record["seq"] > last_seq]
+
+    def _read_stored(self, conversation_id, since):
+        data_path, index_path = self._paths(conversation_id)
+        try:
+            with open(index_path, "rb") as index:
+                index.seek(since * _OFFSET.size)
+                entry = index.read(_OFFSET.size)
+        except OSError:
+            return []
+        if len(entry) < _OFFSET.size:
+            return []
+        (start,) = _OFFSET.unpack(entry)
+
+        with open(data_path, "rb") as data:
+            if os.fstat(data.fileno()).st_size <= start:
+                return []
+            with mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                tail = mapped[start:]
+        # Drop a trailing partial line the writer may still be appending
+        lines = tail.split(b"\n")[:-1]
+        return [json.loads(line) for line in lines]
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        by_conversation = {}
+        for conversation_id, record in batch:
+            by_conversation.setdefault(conversation_id, []).append(record)
+
+        for conversation_id, records in by_conversation.items():
+            try:
+                data_path, index_path = self._paths(conversation_id)
+                with open(data_path, "ab") as data, open(index_path, "ab") as index:
+                    offset = data.tell()
+                    lines, offsets = [], []
+                    for record in records:
+                        line = (json.dumps(record) + "\n").encode("utf-8")
+                        offsets.append(_OFFSET.pack(offset))
+                        lines.append(line)
+                        offset += len(line)
+                    # Data first, so the index never points past the end of the file
+                    data.write(b"".join(lines))
+                    data.flush()
+                    index.write(b"".join(offsets))
+            except (OSError, ValueError) as e:
+                print(f"Error writing transcript {conversation_id}: {e}")
+                continue
+            written = records[-1]["seq"]
+            with self._lock:
+                pending = self._pending.get(conversation_id, [])
+                self._pending[conversation_id] = [record for record in pending if record["seq"] > written]
+                if not self._pending[conversation_id]:
+                    del self._pending[conversation_id]
+                    if conversation_id in self._finished:
+                        self._finished.discard(conversation_id)
+                        self._next_seq.pop(conversation_id, None)
+
+    def forget(self, conversation_id):
+        """
+        Drops the in-memory sequence counter of a finished conversation, at
+        once or when its queued records are written. Its transcript stays on
+        disk and can still be read.
+        """
+        with self._lock:
+            if conversation_id in self._pending:
+                self._finished.add(conversation_id)
+            else:
+                self._next_seq.pop(conversation_id, None)
+
+    def prune(self, max_age):
+        """
+        Deletes transcripts not written to for `max_age` seconds. Returns how many were removed.
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        for name in os.listdir(self.directory):
+            conversation_id, extension = os.path.splitext(name)
+            if extension != ".jsonl" or not _CONVERSATION_ID.match(conversation_id):
+                continue
+            data_path, index_path = self._paths(conversation_id)
+            try:
+                if os.path.getmtime(data_path) > cutoff:
+                    continue
+                os.remove(data_path)
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+            except OSError as e:
+                print(f"Error pruning transcript {conversation_id}: {e}")
+                continue
+            removed += 1
+        return removed
+
+    def close(self):
+        """
+        Writes everything still queued and stops the writer thread.
+        """
+        self._queue.put(None)
+        self._writer.join()
@@ -17,23 +17,102 @@ function App() {
   const [toxicityLevel, setToxicityLevel] = useState(0);
   const [mediatorEnabled, setMediatorEnabled] = useState(false);
   const [conversationActive, setConversationActive] = useState(false);
+  const [streamingMessage, setStreamingMessage] = useState(null); // Partial message while tokens stream in
+  const [pauseNotice, setPauseNotice] = useState(''); // Shown while the backend waits out API failures
 
   const socketRef = useRef(null);
+  const conversationIdRef = useRef(localStorage.getItem('conversationId')); // Survives page reloads
+  const nextSeqRef = useRef(0); // Sequence number of the first message we have not received
+  const seenSeqsRef = useRef(new Set()); // Sequence numbers received, live or through a replay
 
   useEffect(() => {
     socketRef.current = io('http://localhost:5000');
 
+    const markSeen = (seq) => {
+      seenSeqsRef.current.add(seq);
+      while (seenSeqsRef.current.has(nextSeqRef.current)) {
+        nextSeqRef.current += 1;
+      }
+    };
+
+    socketRef.current.on('connect', () => {
+      // Ask the backend for any messages missed while disconnected or before a reload
+      if (conversationIdRef.current) {
+        socketRef.current.emit('resume_conversation', {
+          conversation_id: conversationIdRef.current,
+          since: nextSeqRef.current,
+        });
+      }
+    });
+
+    socketRef.current.on('conversation_started', (data) => {
+      conversationIdRef.current = data.conversation_id;
+      localStorage.setItem('conversationId', data.conversation_id);
+      nextSeqRef.current = 0;
+      seenSeqsRef.current = new Set();
+    });
+
+    socketRef.current.on('conversation_replay', (data) => {
+      if (data.conversation_id !== conversationIdRef.current) return;
+      const missing = data.messages.filter((m) => !seenSeqsRef.current.has(m.seq));
+      if (missing.length > 0) {
+        missing.forEach((m) => markSeen(m.seq));
+        setConversation((prev) => [...prev, ...missing]);
+      }
+      // After a reload the conversation may still be running; show its Stop button again
+      setConversationActive(data.active);
+      setLoading(data.active);
+    });
+
+    socketRef.current.on('conversation_ended', (data) => {
+      if (data.conversation_id !== conversationIdRef.current) return;
+      // The backend stopped the conversation while we were away; stop resuming it on later loads
+      conversationIdRef.current = null;
+      localStorage.removeItem('conversationId');
+      setConversationActive(false);
+      setLoading(false);
+      setStreamingMessage(null);
+      setPauseNotice('');
+    });
+
     socketRef.current.on('conversation_response', (data) => {
       setLoading(false); // Hide typing indicator after response
+      setStreamingMessage(null);
+      if (data.seq !== undefined) {
+        if (seenSeqsRef.current.has(data.seq)) return; // Already received through a replay
+        markSeen(data.seq);
+      }
       setConversation((prev) => [...prev, data]);
     });
 
+    socketRef.current.on('conversation_token', (data) => {
+      setStreamingMessage((prev) => ({
+        agent: data.agent,
+        message: (prev && prev.agent === data.agent ? prev.message : '') + data.token,
+      }));
+    });
+
+    socketRef.current.on('conversation_discard', () => {
+      setStreamingMessage(null); // Drop a streamed message that failed moderation
+    });
+
+    socketRef.current.on('conversation_paused', (data) => {
+      setLoading(false);
+      setPauseNotice(`${data.reason}. Retrying in ${Math.round(data.retry_in)}s...`);
+    });
+
+    socketRef.current.on('conversation_resumed', () => {
+      setPauseNotice('');
+    });
+
     socketRef.current.on('agent_typing', () => {
       setLoading(true); // Show typing indicator when agent is typing
+      setStreamingMessage(null);
     });
 
     socketRef.current.on('error', (error) => {
       setLoading(false); // Hide typing indicator in case of error
+      setStreamingMessage(null);
       console.error("Socket error:", error);
     });
 
@@ -75,6 +154,10 @@ function App() {
   const handleStopConversation = () => {
     setConversationActive(false);
     setLoading(false); // Stop loading when conversation is stopped
+    setStreamingMessage(null);
+    setPauseNotice('');
+    conversationIdRef.current = null; // A stopped conversation is not resumed on reload
+    localStorage.removeItem('conversationId');
     if (socketRef.current) {
       socketRef.current.emit('stop_conversation');
     }
@@ -196,6 +279,7 @@ function App() {
 
         <div>
   <h2>Conversation:</h2>
+  {pauseNotice && <p className="loading-indicator">{pauseNotice}</p>}
   {conversation.length > 0 ? (
     <div>
       {conversation.map((item, index) => (
@@ -214,7 +298,9 @@ function App() {
           <p
             className={`mb-2 p-2  w-[40%] ${conversation.length % 2 === 0 ? 'bg-green-100 text-black rounded-lg rounded-tl-none' : 'bg-blue-100 text-black rounded-lg rounded-tr-none'}`}
           >
-            Typing...
+            {streamingMessage ? (
+              <><strong>{streamingMessage.agent}</strong>: {streamingMessage.message}</>
+            ) : 'Typing...'}
           </p>
         </div>
       )}